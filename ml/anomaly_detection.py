@@ -0,0 +1,617 @@
+"""
+Anomaly Detection for Campus Infrastructure Issues
+Detects unusual patterns in issue reports (spikes, temporal anomalies)
+"""
+
+import hashlib
+import logging
+import warnings
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+try:
+    # Route the SVM family (covers OneClassSVM) through Intel oneDAL's
+    # threaded SIMD kernels. Must run before the sklearn imports below
+    # so class resolution picks up the patched versions. oneDAL has no
+    # IsolationForest implementation — patch_sklearn raises ValueError
+    # for unknown names — and a patching failure must degrade to stock
+    # sklearn, never take the importing service down.
+    from sklearnex import patch_sklearn
+
+    try:
+        patch_sklearn(name=["svm"])
+        SKLEARNEX_AVAILABLE = True
+    except Exception as exc:
+        logger.warning(f"sklearnex patching failed, using stock sklearn: {exc}")
+        SKLEARNEX_AVAILABLE = False
+except ImportError:
+    SKLEARNEX_AVAILABLE = False
+
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import OneClassSVM
+
+try:
+    from numba import njit, prange
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _ensure_datetime(issues_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Guarantee created_at is naive-UTC datetime64, parsing at most once.
+    Callers that already pass normalized frames (the API boundary does)
+    pay nothing; tz-aware input is folded to UTC and stripped so the
+    naive-datetime arithmetic downstream stays valid.
+    """
+    created = issues_df["created_at"]
+    if pd.api.types.is_datetime64_any_dtype(created):
+        if getattr(created.dtype, "tz", None) is None:
+            return issues_df
+        return issues_df.assign(
+            created_at=created.dt.tz_convert("UTC").dt.tz_localize(None)
+        )
+    return issues_df.assign(
+        created_at=pd.to_datetime(created, utc=True).dt.tz_localize(None)
+    )
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _rolling_zscores(counts: np.ndarray, w: int):
+        """
+        Centered rolling mean and z-score per row of a
+        (n_buildings, n_days) float32 matrix, O(n_days) per row via an
+        incremental sum / sum-of-squares window. Rows run in parallel.
+        """
+        n_b, n_d = counts.shape
+        means = np.zeros((n_b, n_d), dtype=np.float32)
+        zs = np.zeros((n_b, n_d), dtype=np.float32)
+        half = w // 2
+        for b in prange(n_b):
+            row = counts[b]
+            s = 0.0
+            sq = 0.0
+            lo = 0
+            hi = -1
+            for i in range(n_d):
+                new_lo = max(0, i - half)
+                new_hi = min(n_d - 1, i + half)
+                while hi < new_hi:
+                    hi += 1
+                    s += row[hi]
+                    sq += row[hi] * row[hi]
+                while lo < new_lo:
+                    s -= row[lo]
+                    sq -= row[lo] * row[lo]
+                    lo += 1
+                n = hi - lo + 1
+                mean = s / n
+                means[b, i] = mean
+                if n > 1:
+                    var = (sq - s * mean) / (n - 1)
+                    if var > 1e-12:
+                        zs[b, i] = (row[i] - mean) / np.sqrt(var)
+        return means, zs
+
+
+class AnomalyDetectionModel:
+    """
+    Unsupervised anomaly detector over building feature vectors.
+
+    Supports Isolation Forest (default) and One-Class SVM. When the
+    sklearnex extension is installed the SVM transparently uses Intel
+    oneDAL accelerated kernels (oneDAL has no IsolationForest); pass
+    use_intelex=False to note an opt-out (patching is process-wide, so
+    it only takes effect when the module is imported with sklearnex
+    absent or unpatched).
+    """
+
+    def __init__(
+        self,
+        algorithm: str = "isolation_forest",
+        contamination: float = 0.1,
+        use_intelex: bool = True,
+    ):
+        self.algorithm = algorithm
+        self.contamination = contamination
+        self.use_intelex = use_intelex and SKLEARNEX_AVAILABLE
+        if SKLEARNEX_AVAILABLE and not use_intelex:
+            logger.warning(
+                "use_intelex=False requested but sklearnex patching is "
+                "process-wide and already applied"
+            )
+
+        self._is_gpu = False
+        if algorithm == "isolation_forest":
+            self.model = IsolationForest(
+                n_estimators=100,
+                contamination=contamination,
+                random_state=42,
+                n_jobs=-1,
+            )
+        elif algorithm == "one_class_svm":
+            self.model = OneClassSVM(nu=contamination, kernel="rbf", gamma="scale")
+        elif algorithm.startswith("cuml_"):
+            # CUDA-backed estimators; only pays off once the training set
+            # is large enough to amortize the host-to-device copies
+            try:
+                import cuml
+            except ImportError as exc:
+                raise ValueError(
+                    f"algorithm={algorithm!r} requires the cuml package"
+                ) from exc
+            if algorithm == "cuml_isolation_forest":
+                self.model = cuml.IsolationForest(
+                    n_estimators=100, contamination=contamination
+                )
+            elif algorithm == "cuml_one_class_svm":
+                self.model = cuml.svm.OneClassSVM(nu=contamination, kernel="rbf")
+            else:
+                raise ValueError(f"Unknown algorithm: {algorithm}")
+            self._is_gpu = True
+        else:
+            raise ValueError(f"Unknown algorithm: {algorithm}")
+
+        self.scaler = StandardScaler()
+        self.is_trained = False
+        self.feature_names: List[str] = []
+        # Keyed on a content hash of X; dashboards re-score the same
+        # frame repeatedly, which turns into an O(1) lookup here
+        self._pred_cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._pred_cache_size = 8
+        self._fast_decision = None
+        self._feature_importance_df = None
+
+    def _to_device(self, X_scaled: np.ndarray):
+        if not self._is_gpu:
+            return X_scaled
+        import cupy as cp
+
+        return cp.asarray(X_scaled, dtype=cp.float32)
+
+    def _to_host(self, arr) -> np.ndarray:
+        if not self._is_gpu:
+            return arr
+        import cupy as cp
+
+        return cp.asnumpy(arr)
+
+    @staticmethod
+    def _normalize_scores(anomaly_scores: np.ndarray) -> np.ndarray:
+        """Map raw scores to a [0, 1] anomaly probability (1 = worst)."""
+        min_score = anomaly_scores.min()
+        rng = np.ptp(anomaly_scores)
+        if rng == 0:
+            return np.zeros_like(anomaly_scores)
+        # Multiply by the reciprocal and reuse one buffer: no division
+        # in the hot loop and no extra temporaries
+        prob = np.subtract(anomaly_scores, min_score)
+        prob *= 1.0 / rng
+        np.subtract(1.0, prob, out=prob)
+        return prob
+
+    @staticmethod
+    def _fingerprint(X) -> bytes:
+        if isinstance(X, pd.DataFrame):
+            data = pd.util.hash_pandas_object(X, index=False).values.tobytes()
+        else:
+            data = np.ascontiguousarray(X).tobytes()
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    @staticmethod
+    def _as_float32(X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            return X.to_numpy(dtype=np.float32)
+        return np.asarray(X, dtype=np.float32)
+
+    def train(
+        self, X: pd.DataFrame, feature_names: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Fit the detector and return summary statistics.
+
+        feature_names records the column list when X is a bare ndarray;
+        it is persisted with the scaler so serve-time callers can select
+        the exact training columns.
+        """
+        if feature_names is not None:
+            self.feature_names = list(feature_names)
+        elif isinstance(X, pd.DataFrame):
+            self.feature_names = X.columns.tolist()
+        else:
+            self.feature_names = [f"f{i}" for i in range(X.shape[1])]
+        self._pred_cache.clear()
+        self._fast_decision = None
+        self._feature_importance_df = None
+        # Hand sklearn a float32 ndarray directly: skips per-call
+        # DataFrame introspection and halves memory traffic vs float64
+        X_np = self._as_float32(X)
+        # Contiguous float32 keeps tree scoring on tight cache lines
+        X_scaled = np.ascontiguousarray(
+            self.scaler.fit_transform(X_np), dtype=np.float32
+        )
+        X_scaled = self._to_device(X_scaled)
+        self.model.fit(X_scaled)
+        self.is_trained = True
+
+        predictions = self._to_host(self.model.predict(X_scaled))
+
+        # Expose the training-set results PyOD-style and seed the
+        # prediction cache with them, so reporting flows read the
+        # attributes (or hit the cache) instead of re-scoring the
+        # matrix the model was just fitted on
+        if self.algorithm.endswith("isolation_forest"):
+            anomaly_scores = self._to_host(self.model.score_samples(X_scaled))
+        else:
+            anomaly_scores = self._to_host(self.model.decision_function(X_scaled))
+        self.labels_ = predictions
+        self.decision_scores_ = anomaly_scores
+        self.decision_probabilities_ = self._normalize_scores(anomaly_scores)
+        self._pred_cache[self._fingerprint(X)] = (
+            predictions,
+            anomaly_scores,
+            self.decision_probabilities_,
+        )
+
+        n_anomalies = int((predictions == -1).sum())
+        logger.info(
+            f"Trained {self.algorithm} on {len(X)} samples, "
+            f"{n_anomalies} flagged anomalous"
+        )
+        return {
+            "algorithm": self.algorithm,
+            "n_samples": len(X),
+            "n_features": X.shape[1],
+            "n_anomalies": n_anomalies,
+            "anomaly_rate": n_anomalies / len(X) if len(X) else 0.0,
+        }
+
+    def compile_for_inference(self) -> bool:
+        """
+        Freeze the fitted Isolation Forest into a compiled C batch
+        predictor (sklearn-freezer). Worth it when the same trained
+        model is scored many times; silently a no-op when the package
+        is not installed or the algorithm has no tree ensemble.
+        """
+        if not self.is_trained or self.algorithm != "isolation_forest":
+            return False
+        try:
+            import sklearn_freezer as skf
+        except ImportError:
+            logger.info("sklearn-freezer not installed; keeping sklearn scorer")
+            return False
+        self._fast_decision = skf.compile(
+            self.model.decision_function, backend="c", batch_mode="numpy"
+        )
+        logger.info("Compiled IsolationForest decision function to C")
+        return True
+
+    def detect_anomalies(
+        self, X: pd.DataFrame
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Score a feature matrix. Returns (predictions, raw scores,
+        anomaly probability in [0, 1]); predictions are -1 for anomalies.
+        """
+        if not self.is_trained:
+            raise RuntimeError("Model must be trained before detection")
+
+        key = self._fingerprint(X)
+        cached = self._pred_cache.get(key)
+        if cached is not None:
+            self._pred_cache.move_to_end(key)
+            return cached
+
+        X_np = self._as_float32(X)
+        expected = getattr(self.scaler, "n_features_in_", None)
+        if expected is not None and X_np.shape[1] != expected:
+            # Fail with a clear message before the scaler does; callers
+            # at the API boundary turn this into an error envelope
+            raise ValueError(
+                f"{self.algorithm} was trained on {expected} features "
+                f"but received {X_np.shape[1]}; align the serving "
+                f"features with feature_names or retrain"
+            )
+        X_scaled = np.ascontiguousarray(
+            self.scaler.transform(X_np), dtype=np.float32
+        )
+        if self._fast_decision is not None:
+            # Compiled tree traversal; predict/score derive from one pass
+            decision = self._fast_decision(X_scaled)
+            predictions = np.where(decision < 0, -1, 1)
+            anomaly_scores = decision + self.model.offset_
+        else:
+            X_scaled = self._to_device(X_scaled)
+            predictions = self._to_host(self.model.predict(X_scaled))
+            if self.algorithm.endswith("isolation_forest"):
+                anomaly_scores = self._to_host(self.model.score_samples(X_scaled))
+            else:
+                anomaly_scores = self._to_host(
+                    self.model.decision_function(X_scaled)
+                )
+
+        anomaly_prob = self._normalize_scores(anomaly_scores)
+
+        self._pred_cache[key] = (predictions, anomaly_scores, anomaly_prob)
+        while len(self._pred_cache) > self._pred_cache_size:
+            self._pred_cache.popitem(last=False)
+        return predictions, anomaly_scores, anomaly_prob
+
+    def get_feature_importance(self) -> Optional[pd.DataFrame]:
+        """Feature importances (Isolation Forest only)."""
+        if not self.is_trained or self.algorithm != "isolation_forest":
+            return None
+        if self._feature_importance_df is not None:
+            return self._feature_importance_df
+        per_tree = np.mean(
+            [tree.feature_importances_ for tree in self.model.estimators_], axis=0
+        )
+        importance = pd.DataFrame(
+            {"feature": self.feature_names, "importance": per_tree}
+        ).sort_values("importance", ascending=False)
+        self._feature_importance_df = importance
+        return importance
+
+    def save_model(self, model_path: str, scaler_path: str) -> None:
+        # Uncompressed pickle protocol 5: joblib can only memory-map
+        # plain archives, and the mmap_mode="r" load below is what
+        # shares the estimator arrays copy-on-write across forked
+        # workers — compression would silently disable it
+        joblib.dump(self.model, model_path, protocol=5)
+        # The feature list travels with the scaler so load sites can
+        # reproduce the exact training columns (and order) at serve time
+        joblib.dump(
+            {"scaler": self.scaler, "feature_names": self.feature_names},
+            scaler_path,
+            protocol=5,
+        )
+        logger.info(f"Saved {self.algorithm} model to {model_path}")
+
+    def load_model(
+        self,
+        model_path: str,
+        scaler_path: str,
+        mmap_mode: Optional[str] = "r",
+    ) -> None:
+        # mmap keeps estimator/scaler arrays shared read-only between
+        # forked gunicorn workers. Legacy compressed artifacts cannot be
+        # mapped; joblib ignores the flag for those (with a warning) and
+        # loads them in full
+        self.model = joblib.load(model_path, mmap_mode=mmap_mode)
+        bundle = joblib.load(scaler_path, mmap_mode=mmap_mode)
+        if isinstance(bundle, dict):
+            self.scaler = bundle["scaler"]
+            self.feature_names = bundle.get("feature_names", [])
+        else:
+            # Legacy artifact: bare scaler, no persisted feature list
+            self.scaler = bundle
+            self.feature_names = []
+        self.is_trained = True
+        self._pred_cache.clear()
+        self._fast_decision = None
+        self._feature_importance_df = None
+        logger.info(f"Loaded {self.algorithm} model from {model_path}")
+
+
+class AnomalyFeatureEngineer:
+    """Builds anomaly-oriented statistics per building from raw issues."""
+
+    @staticmethod
+    def engineer_anomaly_features(
+        features: pd.DataFrame, issues_df: pd.DataFrame
+    ) -> pd.DataFrame:
+        """
+        Attach per-building anomaly statistics (issue frequency variance,
+        severity spread, inter-arrival timing) to the feature frame.
+
+        One pass of groupby aggregations covering every building at once,
+        joined back with a single merge — no per-building filtering or
+        label-based scatter writes.
+        """
+        features = features.copy()
+        cols = [
+            "issue_frequency_variance",
+            "severity_mean",
+            "severity_std",
+            "avg_hours_between_issues",
+            "hours_between_issues_std",
+        ]
+        if issues_df is None or issues_df.empty:
+            for col in cols:
+                features[col] = 0.0
+            return features
+
+        issues_df = _ensure_datetime(issues_df)
+
+        # Daily report-rate variability per building
+        daily = issues_df.groupby(
+            ["building_id", issues_df["created_at"].dt.floor("D")]
+        ).size()
+        daily_mean = daily.groupby(level=0).mean()
+        daily_std = daily.groupby(level=0).std()
+        freq_var = daily_std / (daily_mean + 1)
+
+        # One building-level grouping reused for every per-building stat
+        ordered = issues_df.sort_values(["building_id", "created_at"])
+        by_building = ordered.groupby("building_id", sort=False)
+
+        # Severity spread per building
+        severity_stats = by_building["severity"].agg(["mean", "std"])
+
+        # Inter-arrival times (hours) per building
+        deltas = by_building["created_at"].diff().dt.total_seconds() / 3600.0
+        delta_stats = deltas.groupby(ordered["building_id"]).agg(["mean", "std"])
+
+        stats = pd.DataFrame(
+            {
+                "issue_frequency_variance": freq_var,
+                "severity_mean": severity_stats["mean"],
+                "severity_std": severity_stats["std"],
+                "avg_hours_between_issues": delta_stats["mean"],
+                "hours_between_issues_std": delta_stats["std"],
+            }
+        )
+
+        features = features.merge(
+            stats, left_on="id", right_index=True, how="left"
+        )
+        features[cols] = features[cols].fillna(0)
+        return features
+
+
+def detect_spike_anomalies(
+    issues_df: pd.DataFrame,
+    buildings_df: Optional[pd.DataFrame] = None,
+    window_days: int = 7,
+    threshold: float = 2.0,
+) -> List[Dict[str, Any]]:
+    """
+    Detect days where a building's issue count spikes well above its
+    recent baseline, using a rolling z-score over daily counts.
+
+    Fully vectorized: one groupby builds a (days x buildings) count
+    matrix, rolling mean/std run across all buildings at once, and the
+    anomaly mask is a single array comparison. No per-building or
+    per-date Python loops.
+    """
+    if issues_df is None or issues_df.empty:
+        return []
+
+    issues_df = _ensure_datetime(issues_df)
+
+    # Wide daily-count matrix (rows = days, columns = building ids) via a
+    # single C-level bincount over integer (building, day-since-start)
+    # indices — contiguous by construction, so quiet days count as zero
+    stamps = issues_df["created_at"].to_numpy().astype("datetime64[D]")
+    min_day = stamps.min()
+    days = (stamps - min_day).astype("int64")
+    n_days = int(days.max()) + 1
+    codes, building_ids = pd.factorize(issues_df["building_id"])
+    n_buildings = len(building_ids)
+    count_mat = np.bincount(
+        codes * n_days + days, minlength=n_buildings * n_days
+    ).reshape(n_buildings, n_days)
+
+    full_range = pd.date_range(
+        pd.Timestamp(min_day), periods=n_days, freq="D"
+    )
+    counts = pd.DataFrame(count_mat.T, index=full_range, columns=building_ids)
+    if counts.empty:
+        return []
+
+    if NUMBA_AVAILABLE:
+        # JIT kernel: incremental rolling stats, parallel across buildings
+        mat = np.ascontiguousarray(counts.to_numpy(dtype=np.float32).T)
+        mean_mat, z_mat = _rolling_zscores(mat, window_days)
+        rmean = pd.DataFrame(
+            mean_mat.T, index=counts.index, columns=counts.columns
+        )
+        z = pd.DataFrame(z_mat.T, index=counts.index, columns=counts.columns)
+    else:
+        # Strided window view over the contiguous count matrix: C-level
+        # rolling stats without pandas' per-window dispatch
+        from numpy.lib.stride_tricks import sliding_window_view
+
+        mat = counts.to_numpy(dtype=np.float32)
+        pad_before = window_days // 2
+        pad_after = window_days - 1 - pad_before
+        nan_block = np.full((1, mat.shape[1]), np.nan, dtype=np.float32)
+        padded = np.vstack(
+            [np.repeat(nan_block, pad_before, axis=0), mat]
+            + ([np.repeat(nan_block, pad_after, axis=0)] if pad_after else [])
+        )
+        windows = sliding_window_view(padded, window_days, axis=0)
+        with np.errstate(invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            means = np.nanmean(windows, axis=-1)
+            stds = np.nanstd(windows, axis=-1, ddof=1)
+        z_mat = (mat - means) / np.where(stds > 0, stds, np.nan)
+        rmean = pd.DataFrame(means, index=counts.index, columns=counts.columns)
+        z = pd.DataFrame(z_mat, index=counts.index, columns=counts.columns)
+
+    # Gather all hits with fancy indexing — no per-anomaly Python dict
+    # assembly until the final records conversion at the boundary
+    z_vals = z.values
+    hits = np.argwhere(np.abs(z_vals) > threshold)
+    if len(hits) == 0:
+        return []
+    day_idx, bld_idx = hits[:, 0], hits[:, 1]
+    z_hit = z_vals[day_idx, bld_idx]
+    order = np.argsort(-np.abs(z_hit), kind="stable")
+    day_idx, bld_idx, z_hit = day_idx[order], bld_idx[order], z_hit[order]
+
+    out = pd.DataFrame(
+        {
+            "building_id": counts.columns.values[bld_idx],
+            "anomaly_date": counts.index.values[day_idx].astype("datetime64[D]"),
+            "daily_count": counts.values[day_idx, bld_idx].astype(np.int64),
+            "expected_count": np.round(
+                rmean.values[day_idx, bld_idx].astype(np.float64), 2
+            ),
+            "z_score": np.round(z_hit.astype(np.float64), 2),
+            "type": "spike",
+            "severity": np.where(
+                np.abs(z_hit) > threshold + 1, "high", "medium"
+            ),
+        }
+    )
+    out["anomaly_date"] = out["anomaly_date"].astype(str)
+    anomalies = out.to_dict("records")
+    logger.info(f"Detected {len(anomalies)} spike anomalies")
+    return anomalies
+
+
+def detect_temporal_anomalies(
+    issues_df: pd.DataFrame,
+    buildings_df: Optional[pd.DataFrame] = None,
+    z_threshold: float = -2.0,
+) -> List[Dict[str, Any]]:
+    """
+    Detect issues reported unusually soon after the previous one for the
+    same building (burst behaviour), via a z-score on inter-arrival gaps.
+
+    Single pass: one sort, one groupby diff for the gaps and one
+    groupby transform for per-building mean/std — no per-building loop.
+    """
+    if issues_df is None or issues_df.empty:
+        return []
+
+    df = _ensure_datetime(issues_df)
+    df = df.sort_values(["building_id", "created_at"])
+
+    df["delta_h"] = (
+        df.groupby("building_id")["created_at"].diff().dt.total_seconds() / 3600.0
+    )
+    mu = df.groupby("building_id")["delta_h"].transform("mean")
+    sd = df.groupby("building_id")["delta_h"].transform("std")
+    z = (df["delta_h"] - mu) / sd.replace(0, np.nan)
+
+    mask = z < z_threshold
+    hits = df.loc[mask, ["building_id", "created_at", "delta_h"]].assign(
+        z_score=z[mask]
+    )
+
+    out = pd.DataFrame(
+        {
+            "building_id": hits["building_id"].values,
+            "anomaly_date": hits["created_at"].dt.strftime("%Y-%m-%d %H:%M").values,
+            "hours_since_previous": hits["delta_h"].round(2).values,
+            "z_score": hits["z_score"].round(2).values,
+            "type": "rapid_succession",
+            "severity": np.where(
+                hits["z_score"].values < z_threshold - 1, "high", "medium"
+            ),
+        }
+    ).sort_values("z_score", kind="stable")
+    anomalies = out.to_dict("records")
+    logger.info(f"Detected {len(anomalies)} temporal anomalies")
+    return anomalies
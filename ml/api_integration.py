@@ -0,0 +1,955 @@
+"""
+ML Prediction API
+Flask service exposing failure predictions, anomaly detection and risk
+scores to the Node backend under /api/ml/*.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from flask import (
+    Flask,
+    Response,
+    g,
+    has_request_context,
+    request,
+    stream_with_context,
+)
+from werkzeug.local import LocalProxy
+
+from anomaly_detection import (
+    AnomalyDetectionModel,
+    AnomalyFeatureEngineer,
+    detect_spike_anomalies,
+    detect_temporal_anomalies,
+)
+from data_loader import LocalDataLoader
+from failure_prediction import FailurePredictionModel
+from feature_engineering import FeatureEngineer
+from risk_model import RISK_THRESHOLDS, RiskProbabilityModel
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.environ.get(
+    "ML_MODELS_DIR", os.path.join(os.path.dirname(__file__), "models")
+)
+REPORTS_DIR = os.environ.get(
+    "ML_REPORTS_DIR", os.path.join(os.path.dirname(__file__), "reports")
+)
+
+try:
+    from numba import njit, prange
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _risk_kernel_numpy(
+    num_issues, recent_critical, age_days, failure, anomaly, weights
+):
+    """Vectorized risk math: frequency/recency components and the
+    squashed weighted combination, all as aligned float64 arrays."""
+    freq = np.minimum(1.0, np.sqrt(num_issues) / 10.0)
+    crit_ratio = np.where(
+        num_issues > 0, recent_critical / np.maximum(num_issues, 1.0), 0.0
+    )
+    freq = np.minimum(1.0, freq + np.minimum(0.2, crit_ratio * 0.4))
+    recency = np.where(num_issues > 0, 0.5 ** (age_days / 14.0), 0.0)
+    combined = (
+        weights[0] * failure
+        + weights[1] * anomaly
+        + weights[2] * freq
+        + weights[3] * recency
+    )
+    probs = 1.0 / (1.0 + np.exp(-(combined - 0.5) * 6.0))
+    return freq, recency, probs
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _risk_kernel(
+        num_issues, recent_critical, age_days, failure, anomaly, weights
+    ):  # pragma: no cover - exercised only when numba is installed
+        n = num_issues.shape[0]
+        freq = np.empty(n)
+        recency = np.empty(n)
+        probs = np.empty(n)
+        for i in prange(n):
+            f = min(1.0, np.sqrt(num_issues[i]) / 10.0)
+            if num_issues[i] > 0:
+                ratio = recent_critical[i] / num_issues[i]
+                f = min(1.0, f + min(0.2, ratio * 0.4))
+                r = 0.5 ** (age_days[i] / 14.0)
+            else:
+                r = 0.0
+            combined = (
+                weights[0] * failure[i]
+                + weights[1] * anomaly[i]
+                + weights[2] * f
+                + weights[3] * r
+            )
+            freq[i] = f
+            recency[i] = r
+            probs[i] = 1.0 / (1.0 + np.exp(-(combined - 0.5) * 6.0))
+        return freq, recency, probs
+
+    # Warm the JIT at import so the first /risk request does not pay
+    # compile cost
+    _risk_kernel(*([np.zeros(1)] * 5), np.zeros(4))
+else:
+    _risk_kernel = _risk_kernel_numpy
+
+
+def _json_default(obj: Any):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def _dumps(payload: Any) -> bytes:
+    """
+    Serialize with orjson when available. orjson encodes numpy scalars
+    natively and is several times faster than stdlib json for the large
+    /risk and /anomalies record lists.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            payload,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC,
+        )
+    return json.dumps(payload, default=_json_default).encode()
+
+
+def _json(payload: Any) -> Response:
+    return Response(_dumps(payload), mimetype="application/json")
+
+
+def _json_or_unavailable(result: Dict[str, Any]):
+    """
+    Like _json, but model-missing errors become 503 with Retry-After so
+    well-behaved clients back off instead of hammering the API while
+    models are still being trained or deployed.
+    """
+    if result.get("status") == "error" and "not loaded" in str(
+        result.get("error", "")
+    ):
+        return _json(result), 503, {"Retry-After": "30"}
+    return _json(result)
+
+
+PredictionsBundle = namedtuple(
+    "PredictionsBundle", ["raw", "by_risk_level", "alerts"]
+)
+
+
+class _DataCache:
+    """TTL snapshot of loaded data and engineered features."""
+
+    def __init__(self):
+        self.buildings_df: Optional[pd.DataFrame] = None
+        self.issues_df: Optional[pd.DataFrame] = None
+        self.features_df: Optional[pd.DataFrame] = None
+        self.anomaly_features_df: Optional[pd.DataFrame] = None
+        self.anomaly_matrix: Optional[np.ndarray] = None
+        self.id_to_pos: Dict[str, int] = {}
+        self.data_mtime: Optional[float] = None
+        self.cached_at: float = 0.0
+
+
+class PredictionBatcher:
+    """
+    Collapses bursts of single-building prediction requests into one
+    shared inference pass. Callers enqueue (building_id, Future); a
+    daemon thread drains up to BATCH_SIZE requests (or whatever arrived
+    within BATCH_TIMEOUT_MS), runs the full prediction once and routes
+    each result back to its waiting future.
+    """
+
+    def __init__(self, api: "PredictionAPI"):
+        self.api = api
+        self.max_batch = int(os.environ.get("BATCH_SIZE", "64"))
+        self.batch_timeout = (
+            float(os.environ.get("BATCH_TIMEOUT_MS", "10")) / 1000.0
+        )
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def submit(self, building_id: str, timeout: float = 5.0) -> Dict[str, Any]:
+        future: Future = Future()
+        self._queue.put((building_id, future))
+        return future.result(timeout=timeout)
+
+    def _worker(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_timeout
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                result = self.api.get_predictions()
+            except Exception as exc:  # pragma: no cover - defensive
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            # Predictions come back in building order, so the cached
+            # id -> position map resolves each request in O(1) instead
+            # of building a lookup dict per batch
+            predictions: List[Dict[str, Any]] = []
+            id_to_pos: Dict[str, int] = {}
+            if result.get("status") == "success":
+                predictions = result["predictions"]
+                id_to_pos = self.api._cache.id_to_pos
+            for building_id, future in batch:
+                pos = id_to_pos.get(building_id)
+                prediction = (
+                    predictions[pos]
+                    if pos is not None and pos < len(predictions)
+                    else None
+                )
+                if prediction is not None:
+                    future.set_result(
+                        {"status": "success", "prediction": prediction}
+                    )
+                elif result.get("status") != "success":
+                    future.set_result(result)
+                else:
+                    future.set_result(
+                        {
+                            "status": "error",
+                            "error": f"Unknown building {building_id}",
+                        }
+                    )
+
+
+class PredictionAPI:
+    """Holds the trained models and serves formatted results."""
+
+    def __init__(self, models_dir: str = MODELS_DIR, data_ttl: float = 60.0):
+        self.models_dir = models_dir
+        self.data_ttl = data_ttl
+        self.data_path = os.environ.get("ML_DATA_PATH")  # optional parquet/csv
+
+        self.engineer = FeatureEngineer()
+        self.anomaly_engineer = AnomalyFeatureEngineer()
+
+        self.failure_model: Optional[FailurePredictionModel] = None
+        self.anomaly_if: Optional[AnomalyDetectionModel] = None
+        self.anomaly_svm: Optional[AnomalyDetectionModel] = None
+        self.risk_model = RiskProbabilityModel()
+
+        self._cache = _DataCache()
+        self._cache_lock = threading.RLock()
+        self._anomaly_numeric_cols: Optional[List[str]] = None
+        self._batcher = PredictionBatcher(self)
+
+        self._load_failure_model()
+        self._load_anomaly_models()
+        self._load_risk_model()
+
+        # Precomputed /risk response; readers take the reference without
+        # locking and the refresh thread swaps in a new dict atomically
+        self._risk_snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_interval = float(
+            os.environ.get("RISK_SNAPSHOT_SECONDS", "30")
+        )
+        threading.Thread(
+            target=self._risk_refresh_loop, daemon=True
+        ).start()
+
+    # ---------------------------------------------------------------- loading
+
+    def _load_failure_model(self) -> None:
+        model_path = os.path.join(self.models_dir, "failure_model.pkl")
+        scaler_path = os.path.join(self.models_dir, "failure_scaler.pkl")
+        has_model = os.path.exists(model_path) or os.path.exists(
+            os.path.splitext(model_path)[0] + ".ubj"
+        )
+        if has_model and os.path.exists(scaler_path):
+            try:
+                self.failure_model = FailurePredictionModel()
+                self.failure_model.load_model(model_path, scaler_path)
+                return
+            except Exception as exc:
+                logger.error(f"Failed to load failure model: {exc}")
+        logger.warning("Failure prediction model not available")
+        self.failure_model = None
+
+    def _load_anomaly_models(self) -> None:
+        for attr, name, algorithm in (
+            ("anomaly_if", "anomaly_isolation_forest", "isolation_forest"),
+            ("anomaly_svm", "anomaly_one_class_svm", "one_class_svm"),
+        ):
+            model_path = os.path.join(self.models_dir, f"{name}.pkl")
+            scaler_path = os.path.join(self.models_dir, f"{name}_scaler.pkl")
+            if os.path.exists(model_path) and os.path.exists(scaler_path):
+                try:
+                    model = AnomalyDetectionModel(algorithm=algorithm)
+                    model.load_model(model_path, scaler_path)
+                    if algorithm == "isolation_forest":
+                        # Persisted estimators may carry n_jobs=1; scoring
+                        # runs on every /anomalies and /risk request, so
+                        # spread tree evaluation across all cores
+                        model.model.n_jobs = -1
+                    setattr(self, attr, model)
+                    continue
+                except Exception as exc:
+                    logger.error(f"Failed to load {name}: {exc}")
+            logger.warning(f"Anomaly model {name} not available")
+            setattr(self, attr, None)
+
+    def _load_risk_model(self) -> None:
+        path = os.path.join(self.models_dir, "risk_model.pkl")
+        if os.path.exists(path):
+            try:
+                self.risk_model = RiskProbabilityModel.load_model(path)
+                return
+            except Exception as exc:
+                logger.error(f"Failed to load risk model: {exc}")
+        logger.info("Using default risk model weights")
+
+    # ------------------------------------------------------------------ data
+
+    def _get_data(self) -> _DataCache:
+        """
+        Loaded data plus engineered features, cached with a TTL and
+        invalidated when the backing data file changes. Every endpoint
+        goes through here instead of reloading from scratch.
+        """
+        cache = self._cache
+        now = time.monotonic()
+        mtime = None
+        if self.data_path and os.path.exists(self.data_path):
+            mtime = os.path.getmtime(self.data_path)
+
+        fresh = (
+            cache.features_df is not None
+            and now - cache.cached_at < self.data_ttl
+            and mtime == cache.data_mtime
+        )
+        if fresh:
+            return cache
+
+        with self._cache_lock:
+            # Re-check under the lock: another thread may have refreshed
+            if (
+                cache.features_df is not None
+                and time.monotonic() - cache.cached_at < self.data_ttl
+                and mtime == cache.data_mtime
+            ):
+                return cache
+
+            buildings_df, issues_df = self._load_raw(mtime)
+            features_df = self.engineer.engineer_building_features(
+                buildings_df, issues_df
+            )
+            category_features = self.engineer.engineer_category_features(
+                buildings_df, issues_df
+            )
+            features_df = features_df.merge(category_features, on="id", how="left")
+            anomaly_features_df = self.anomaly_engineer.engineer_anomaly_features(
+                features_df, issues_df
+            )
+
+            if self._anomaly_numeric_cols is None:
+                # The persisted model carries the exact training columns;
+                # selecting those (in order) keeps the serving matrix
+                # aligned with the fitted scaler. Fall back to dtype
+                # selection for legacy artifacts without a feature list.
+                model = self.anomaly_if or self.anomaly_svm
+                persisted = getattr(model, "feature_names", None)
+                if persisted and set(persisted) <= set(
+                    anomaly_features_df.columns
+                ):
+                    self._anomaly_numeric_cols = list(persisted)
+                else:
+                    numeric = anomaly_features_df.select_dtypes(
+                        include=[np.number]
+                    ).columns
+                    self._anomaly_numeric_cols = [
+                        c for c in numeric if c not in ("id",)
+                    ]
+            # Clean float32 matrix shared by every anomaly request; the
+            # in-place nan_to_num avoids the fillna/replace frame copies
+            anomaly_matrix = anomaly_features_df[
+                self._anomaly_numeric_cols
+            ].to_numpy(dtype=np.float32)
+            np.nan_to_num(
+                anomaly_matrix, copy=False, nan=0.0, posinf=0.0, neginf=0.0
+            )
+
+            cache.buildings_df = buildings_df
+            cache.issues_df = issues_df
+            cache.features_df = features_df
+            cache.anomaly_features_df = anomaly_features_df
+            cache.anomaly_matrix = anomaly_matrix
+            cache.id_to_pos = {
+                bid: i for i, bid in enumerate(buildings_df["id"])
+            }
+            cache.data_mtime = mtime
+            cache.cached_at = time.monotonic()
+            logger.info("Data cache refreshed")
+            return cache
+
+    def _load_raw(self, mtime: Optional[float]):
+        if self.data_path and mtime is not None:
+            if self.data_path.endswith(".parquet"):
+                issues_df = pd.read_parquet(self.data_path)
+            else:
+                issues_df = pd.read_csv(self.data_path)
+            buildings_df = (
+                issues_df[["building_id"]]
+                .drop_duplicates()
+                .rename(columns={"building_id": "id"})
+            )
+            buildings_df["name"] = buildings_df["id"]
+        else:
+            buildings_df, issues_df = LocalDataLoader.load_sample_data()
+        # severity fits int8 and building_id repeats heavily; narrow
+        # dtypes make the per-request scans and groupbys cheaper
+        issues_df["severity"] = issues_df["severity"].astype("int8")
+        issues_df["building_id"] = issues_df["building_id"].astype("category")
+        return buildings_df, issues_df
+
+    # ------------------------------------------------------------ predictions
+
+    def get_predictions(self) -> Dict[str, Any]:
+        if self.failure_model is None:
+            return {"status": "error", "error": "Failure model not loaded"}
+        data = self._get_data()
+        predictions = self.failure_model.predict_time_window(data.features_df)
+        return {
+            "status": "success",
+            "predictions": predictions,
+            "generated_at": datetime.now().isoformat(),
+        }
+
+    def get_predictions_by_building(self, building_id: str) -> Dict[str, Any]:
+        try:
+            return self._batcher.submit(building_id)
+        except FutureTimeoutError:
+            # concurrent.futures.TimeoutError only aliases the builtin
+            # from Python 3.11; catching it explicitly keeps the error
+            # envelope on 3.9/3.10 too
+            return {"status": "error", "error": "Prediction timed out"}
+
+    # -------------------------------------------------------------- anomalies
+
+    def get_anomalies(self) -> Dict[str, Any]:
+        if self.anomaly_if is None and self.anomaly_svm is None:
+            return {"status": "error", "error": "Anomaly models not loaded"}
+        data = self._get_data()
+        features_df = data.anomaly_features_df
+        X = data.anomaly_matrix
+
+        if_probs = None
+        svm_probs = None
+        try:
+            if self.anomaly_if is not None:
+                _, _, if_probs = self.anomaly_if.detect_anomalies(X)
+            if self.anomaly_svm is not None:
+                _, _, svm_probs = self.anomaly_svm.detect_anomalies(X)
+        except ValueError as exc:
+            # Stale artifacts whose feature set no longer matches the
+            # served frame degrade to the error envelope, not a 500
+            logger.error(f"Anomaly scoring failed: {exc}")
+            return {
+                "status": "error",
+                "error": f"Anomaly scoring failed: {exc}",
+            }
+        if if_probs is not None and svm_probs is not None:
+            ensemble_probs = (if_probs + svm_probs) / 2.0
+        else:
+            ensemble_probs = if_probs if if_probs is not None else svm_probs
+
+        # Classify and filter with array masks; no per-row .iloc
+        # materialization
+        ids = features_df["id"].to_numpy()
+        names = (
+            features_df["name"].to_numpy() if "name" in features_df else ids
+        )
+        severities = np.select(
+            [ensemble_probs >= 0.8, ensemble_probs >= 0.6],
+            ["critical", "high"],
+            default="medium",
+        )
+        keep = ensemble_probs > 0.4
+        order = np.argsort(-ensemble_probs[keep], kind="stable")
+        now_iso = datetime.now().isoformat()
+
+        def _col(probs):
+            if probs is None:
+                return [None] * int(keep.sum())
+            return probs[keep][order]
+
+        anomalies = [
+            {
+                "building_id": bid,
+                "building_name": name,
+                "anomaly_probability": round(prob, 4),
+                "isolation_forest_score": if_p,
+                "svm_score": svm_p,
+                "severity": sev,
+                "detected_at": now_iso,
+            }
+            for bid, name, prob, if_p, svm_p, sev in zip(
+                ids[keep][order],
+                names[keep][order],
+                ensemble_probs[keep][order],
+                _col(if_probs),
+                _col(svm_probs),
+                severities[keep][order],
+            )
+        ]
+
+        counts = Counter(a["severity"] for a in anomalies)
+        return {
+            "status": "success",
+            "anomalies": anomalies,
+            "total_buildings": len(features_df),
+            "critical_count": counts.get("critical", 0),
+            "high_count": counts.get("high", 0),
+            "medium_count": counts.get("medium", 0),
+            "generated_at": now_iso,
+        }
+
+    def get_spike_anomalies(self) -> Dict[str, Any]:
+        data = self._get_data()
+        anomalies = detect_spike_anomalies(data.issues_df, data.buildings_df)
+        return {
+            "status": "success",
+            "anomalies": anomalies,
+            "generated_at": datetime.now().isoformat(),
+        }
+
+    def get_temporal_anomalies(self) -> Dict[str, Any]:
+        data = self._get_data()
+        anomalies = detect_temporal_anomalies(data.issues_df, data.buildings_df)
+        return {
+            "status": "success",
+            "anomalies": anomalies,
+            "generated_at": datetime.now().isoformat(),
+        }
+
+    # -------------------------------------------------- per-request memoization
+
+    def _cached_predictions(self) -> Dict[str, Any]:
+        """get_predictions(), computed at most once per request."""
+        if not has_request_context():
+            return self.get_predictions()
+        if not hasattr(g, "ml_predictions"):
+            g.ml_predictions = self.get_predictions()
+        return g.ml_predictions
+
+    def _cached_anomalies(self) -> Dict[str, Any]:
+        """get_anomalies(), computed at most once per request."""
+        if not has_request_context():
+            return self.get_anomalies()
+        if not hasattr(g, "ml_anomalies"):
+            g.ml_anomalies = self.get_anomalies()
+        return g.ml_anomalies
+
+    # ------------------------------------------------------------------- risk
+
+    def get_risk_scores(self) -> Dict[str, Any]:
+        data = self._get_data()
+        buildings_df = data.buildings_df
+        issues_df = data.issues_df
+
+        # Scatter model outputs straight into arrays aligned with the
+        # building order; no intermediate dict keyed on string ids
+        id_to_pos = data.id_to_pos
+        failure_arr = np.zeros(len(buildings_df), dtype=np.float64)
+        predictions = self._cached_predictions()
+        if predictions.get("status") == "success":
+            for p in predictions["predictions"]:
+                pos = id_to_pos.get(p["building_id"])
+                if pos is not None:
+                    failure_arr[pos] = p["failure_probability"]
+
+        anomaly_arr = np.zeros(len(buildings_df), dtype=np.float64)
+        anomalies = self._cached_anomalies()
+        if anomalies.get("status") == "success":
+            for a in anomalies["anomalies"]:
+                pos = id_to_pos.get(a["building_id"])
+                if pos is not None:
+                    anomaly_arr[pos] = a["anomaly_probability"]
+
+        # One grouped pass over the issues frame produces every
+        # per-building statistic as an aligned array; no per-building
+        # boolean filtering
+        ids = buildings_df["id"]
+        by_building = issues_df.groupby("building_id")
+        num_issues = (
+            by_building.size()
+            .reindex(ids, fill_value=0)
+            .to_numpy(dtype=np.float64)
+        )
+        recent_critical = (
+            issues_df.assign(crit=issues_df["severity"] >= 4)
+            .groupby("building_id")["crit"]
+            .sum()
+            .reindex(ids, fill_value=0)
+            .to_numpy(dtype=np.float64)
+        )
+        last_seen = (
+            pd.to_datetime(issues_df["created_at"])
+            .groupby(issues_df["building_id"])
+            .max()
+            .reindex(ids)
+        )
+        now = datetime.now()
+        age_days = np.nan_to_num(
+            (now - last_seen).dt.total_seconds().to_numpy() / 86400.0,
+            nan=0.0,
+        )
+
+        w = self.risk_model.weights
+        weights = np.array(
+            [w["failure"], w["anomaly"], w["frequency"], w["recency"]]
+        )
+        freq_scores, recency_scores, risk_probs = _risk_kernel(
+            num_issues,
+            recent_critical,
+            age_days,
+            failure_arr,
+            anomaly_arr,
+            weights,
+        )
+        levels = np.select(
+            [risk_probs >= t for t, _ in RISK_THRESHOLDS[:-1]],
+            [level for _, level in RISK_THRESHOLDS[:-1]],
+            default="LOW",
+        ).tolist()
+
+        computed_at = now.isoformat()
+        building_risks = [
+            {
+                "risk_probability": round(float(risk_probs[i]), 4),
+                "risk_level": levels[i],
+                "failure_component": round(float(failure_arr[i]), 4),
+                "anomaly_component": round(float(anomaly_arr[i]), 4),
+                "frequency_component": round(float(freq_scores[i]), 4),
+                "recency_component": round(float(recency_scores[i]), 4),
+                "computed_at": computed_at,
+                "building_id": building_id,
+            }
+            for i, building_id in enumerate(ids)
+        ]
+
+        building_risks.sort(key=lambda r: r["risk_probability"], reverse=True)
+        counts = Counter(levels)
+        summary = {
+            "critical_count": counts.get("CRITICAL", 0),
+            "high_count": counts.get("HIGH", 0),
+            "medium_count": counts.get("MEDIUM", 0),
+            "low_count": counts.get("LOW", 0),
+        }
+        return {
+            "status": "success",
+            "risk_scores": building_risks,
+            "summary": summary,
+            "generated_at": now.isoformat(),
+        }
+
+    def _risk_refresh_loop(self) -> None:
+        while True:
+            try:
+                result = self.get_risk_scores()
+                if result.get("status") == "success":
+                    self._risk_snapshot = result
+            except Exception:  # pragma: no cover - defensive
+                logger.exception("Risk snapshot refresh failed")
+            time.sleep(self._snapshot_interval)
+
+    def get_risk_snapshot(self) -> Dict[str, Any]:
+        """
+        Latest precomputed risk response; falls back to a live
+        computation until the refresh thread has produced one.
+        """
+        snapshot = self._risk_snapshot
+        if snapshot is not None:
+            return snapshot
+        return self.get_risk_scores()
+
+    def get_priority_buildings(self, limit: int = 10) -> Dict[str, Any]:
+        result = self.get_risk_snapshot()
+        if result.get("status") != "success":
+            return result
+        return {
+            "status": "success",
+            "priority_buildings": result["risk_scores"][:limit],
+            "generated_at": datetime.now().isoformat(),
+        }
+
+    # ------------------------------------------------------------ alerts etc.
+
+    def _build_predictions_bundle(self) -> "PredictionsBundle":
+        """One pass over the formatted predictions producing everything
+        the alert and summary endpoints need."""
+        result = self._cached_predictions()
+        by_level: Dict[str, List[Dict[str, Any]]] = {}
+        alerts: List[Dict[str, Any]] = []
+        if result.get("status") == "success":
+            now_iso = datetime.now().isoformat()
+            for p in result["predictions"]:
+                level = p["failure_risk_level"]
+                by_level.setdefault(level, []).append(p)
+                if level in ("CRITICAL", "HIGH"):
+                    alerts.append(
+                        {
+                            "building_id": p["building_id"],
+                            "building_name": p["building_name"],
+                            "priority": 1 if level == "CRITICAL" else 2,
+                            "message": (
+                                f"{p['building_name']} has "
+                                f"{level.lower()} failure risk "
+                                f"({p['failure_probability']:.0%}) in the "
+                                f"next {p['time_window']}"
+                            ),
+                            "created_at": now_iso,
+                        }
+                    )
+            alerts.sort(key=lambda a: a["priority"])
+        return PredictionsBundle(result, by_level, alerts)
+
+    def _predictions_bundle(self) -> "PredictionsBundle":
+        """_build_predictions_bundle(), computed at most once per request."""
+        if not has_request_context():
+            return self._build_predictions_bundle()
+        if not hasattr(g, "ml_predictions_bundle"):
+            g.ml_predictions_bundle = self._build_predictions_bundle()
+        return g.ml_predictions_bundle
+
+    def get_alerts(self) -> Dict[str, Any]:
+        bundle = self._predictions_bundle()
+        if bundle.raw.get("status") != "success":
+            return bundle.raw
+        alerts = bundle.alerts
+        return {
+            "status": "success",
+            "alerts": alerts,
+            "critical_count": sum(1 for a in alerts if a["priority"] == 1),
+            "generated_at": datetime.now().isoformat(),
+        }
+
+    def get_risk_summary(self) -> Dict[str, Any]:
+        bundle = self._predictions_bundle()
+        if bundle.raw.get("status") != "success":
+            return bundle.raw
+        return {
+            "status": "success",
+            "summary": {
+                level: len(items)
+                for level, items in bundle.by_risk_level.items()
+            },
+            "by_risk_level": bundle.by_risk_level,
+            "generated_at": datetime.now().isoformat(),
+        }
+
+
+app = Flask(__name__)
+
+_api: Optional[PredictionAPI] = None
+_api_lock = threading.Lock()
+
+
+def get_api() -> PredictionAPI:
+    """
+    Construct the PredictionAPI on first use. Importing this module
+    (tests, CLI tools, the gunicorn master with --preload) no longer
+    pays for the model pickle loads up front.
+    """
+    global _api
+    if _api is None:
+        with _api_lock:
+            if _api is None:
+                _api = PredictionAPI()
+    return _api
+
+
+api = LocalProxy(get_api)
+
+
+@app.route("/api/ml/health")
+def health():
+    return _json(
+        {
+            "status": "healthy",
+            "failure_model": api.failure_model is not None,
+            "anomaly_models": api.anomaly_if is not None
+            or api.anomaly_svm is not None,
+            "timestamp": datetime.now().isoformat(),
+        }
+    )
+
+
+@app.route("/api/ml/predictions")
+def predictions():
+    return _json_or_unavailable(api.get_predictions())
+
+
+@app.route("/api/ml/predictions/<building_id>")
+def predictions_by_building(building_id: str):
+    return _json_or_unavailable(api.get_predictions_by_building(building_id))
+
+
+@app.route("/api/ml/anomalies")
+def anomalies():
+    return _json_or_unavailable(api.get_anomalies())
+
+
+@app.route("/api/ml/anomalies/spikes")
+def spike_anomalies():
+    return _json(api.get_spike_anomalies())
+
+
+@app.route("/api/ml/anomalies/temporal")
+def temporal_anomalies():
+    return _json(api.get_temporal_anomalies())
+
+
+@app.route("/api/ml/risk")
+def risk():
+    result = api.get_risk_snapshot()
+    if result.get("status") != "success":
+        return _json(result)
+
+    def generate():
+        # Emit the risk_scores array record by record so the full
+        # serialized payload never has to sit in memory alongside the
+        # result dict.
+        yield b'{"status":"success","risk_scores":['
+        for i, record in enumerate(result["risk_scores"]):
+            if i:
+                yield b","
+            yield _dumps(record)
+        yield b'],"summary":' + _dumps(result["summary"])
+        yield b',"generated_at":' + _dumps(result["generated_at"]) + b"}"
+
+    return Response(
+        stream_with_context(generate()), mimetype="application/json"
+    )
+
+
+@app.route("/api/ml/risk/priority")
+def risk_priority():
+    limit = request.args.get("limit", default=10, type=int)
+    return _json(api.get_priority_buildings(limit))
+
+
+@app.route("/api/ml/risk/category")
+def risk_category():
+    data = api._get_data()
+    return _json(
+        {
+            "status": "success",
+            "category_risks": api.risk_model.calculate_category_risk(
+                data.issues_df
+            ),
+            "generated_at": datetime.now().isoformat(),
+        }
+    )
+
+
+@app.route("/api/ml/risk/report")
+def risk_report():
+    report_path = os.path.join(REPORTS_DIR, "risk_report.json")
+    if os.path.exists(report_path):
+        with open(report_path) as f:
+            return _json(json.load(f))
+    result = api.get_risk_snapshot()
+    if result.get("status") != "success":
+        return _json(result)
+    risks = {r["building_id"]: r for r in result["risk_scores"]}
+    report = api.risk_model.generate_risk_report(
+        risks, api._get_data().buildings_df
+    )
+    return _json({"status": "success", "report": report})
+
+
+@app.route("/api/ml/critical-buildings")
+def critical_buildings():
+    result = api.get_risk_snapshot()
+    if result.get("status") != "success":
+        return _json(result)
+    return _json(
+        {
+            "status": "success",
+            "buildings": [
+                r for r in result["risk_scores"] if r["risk_level"] == "CRITICAL"
+            ],
+        }
+    )
+
+
+@app.route("/api/ml/high-risk-buildings")
+def high_risk_buildings():
+    result = api.get_risk_snapshot()
+    if result.get("status") != "success":
+        return _json(result)
+    return _json(
+        {
+            "status": "success",
+            "buildings": [
+                r
+                for r in result["risk_scores"]
+                if r["risk_level"] in ("CRITICAL", "HIGH")
+            ],
+        }
+    )
+
+
+@app.route("/api/ml/alerts")
+def alerts():
+    return _json_or_unavailable(api.get_alerts())
+
+
+@app.route("/api/ml/risk/summary")
+def risk_summary():
+    return _json_or_unavailable(api.get_risk_summary())
+
+
+if __name__ == "__main__":
+    # Development fallback only: Flask's built-in server handles one
+    # request at a time. In production run under gunicorn so pandas/ML
+    # work is spread across processes and threads:
+    #
+    #   gunicorn -w $(nproc) -k gthread --threads 4 --preload \
+    #       --bind 0.0.0.0:5000 api_integration:app
+    #
+    # --preload loads the models once in the master process; forked
+    # workers share them copy-on-write. BATCH_SIZE / BATCH_TIMEOUT_MS
+    # tune the per-worker prediction batcher.
+    app.run(host="0.0.0.0", port=5000, debug=False)
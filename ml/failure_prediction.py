@@ -0,0 +1,287 @@
+"""
+Failure Prediction Model
+Supervised classifier estimating the probability that a building sees a
+severe issue in the next time window.
+"""
+
+import logging
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import classification_report, roc_auc_score
+from sklearn.model_selection import StratifiedShuffleSplit
+
+try:
+    from xgboost import XGBClassifier
+
+    XGBOOST_AVAILABLE = True
+except ImportError:
+    XGBOOST_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+_RISK_LABELS = np.array(["LOW", "MEDIUM", "HIGH", "CRITICAL"])
+
+
+def _cuda_available() -> bool:
+    """Best-effort GPU probe for XGBoost's device parameter."""
+    return shutil.which("nvidia-smi") is not None
+
+
+class FailurePredictionModel:
+    """XGBoost (default) or RandomForest failure classifier."""
+
+    def __init__(self, model_type: str = "xgboost"):
+        if model_type == "xgboost" and not XGBOOST_AVAILABLE:
+            logger.warning("xgboost not installed, falling back to random_forest")
+            model_type = "random_forest"
+        self.model_type = model_type
+
+        if model_type == "xgboost":
+            # hist bins features into uint8 histograms - the standard
+            # 5-10x training speedup over the exact splitter at
+            # equivalent accuracy
+            self.classifier = XGBClassifier(
+                n_estimators=200,
+                max_depth=5,
+                learning_rate=0.1,
+                eval_metric="logloss",
+                random_state=42,
+                tree_method="hist",
+                max_bin=256,
+                device="cuda" if _cuda_available() else "cpu",
+                n_jobs=-1,
+            )
+        elif model_type == "random_forest":
+            self.classifier = RandomForestClassifier(
+                n_estimators=200, max_depth=8, random_state=42, n_jobs=-1
+            )
+        else:
+            raise ValueError(f"Unknown model_type: {model_type}")
+
+        # Tree ensembles are invariant to monotonic feature scaling, so
+        # no scaler is fitted; the attribute stays for older persisted
+        # bundles that carry one
+        self.scaler = None
+        self.is_trained = False
+        self.feature_names: List[str] = []
+        self._predict_buffer: Optional[np.ndarray] = None
+        self._numeric_cols: Optional[List[str]] = None
+
+    def prepare_data(
+        self, features_df: pd.DataFrame, label_col: str = "will_fail"
+    ) -> Tuple[pd.DataFrame, Optional[pd.Series]]:
+        """Select numeric feature columns and clean NaN/inf values."""
+        # Dtype introspection over every column is constant metadata
+        # work; reuse the selection as long as the schema still covers it
+        if self._numeric_cols is not None and set(features_df.columns) >= set(
+            self._numeric_cols
+        ):
+            feature_cols = self._numeric_cols
+        else:
+            numeric_cols = features_df.select_dtypes(
+                include=[np.number]
+            ).columns
+            feature_cols = [c for c in numeric_cols if c != label_col]
+            self._numeric_cols = feature_cols
+
+        # One vectorized pass handles NaN and +/-inf without the frame
+        # copies fillna/replace would allocate; float32 matches
+        # XGBoost's internal representation
+        X_arr = features_df[feature_cols].to_numpy(dtype=np.float32, copy=True)
+        np.nan_to_num(X_arr, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+        X = pd.DataFrame(
+            X_arr, columns=list(feature_cols), index=features_df.index
+        )
+
+        y = features_df[label_col] if label_col in features_df else None
+        return X, y
+
+    def train(self, features_df: pd.DataFrame) -> Dict[str, Any]:
+        """Fit on the labelled feature frame and return holdout metrics."""
+        X, y = self.prepare_data(features_df)
+        if y is None:
+            raise ValueError("Training data must include a will_fail column")
+        self.feature_names = X.columns.tolist()
+
+        # Split by index and slice the raw float32 array directly: one
+        # stratified shuffle, plain memcpy slices, no pandas index
+        # bookkeeping on the split frames
+        X_arr = X.to_numpy()
+        y_arr = y.to_numpy()
+        # Stratification needs at least two members per class; tiny or
+        # lopsided datasets fall back to a plain seeded shuffle
+        class_counts = y.value_counts()
+        if len(class_counts) > 1 and class_counts.min() >= 2:
+            splitter = StratifiedShuffleSplit(
+                n_splits=1, test_size=0.25, random_state=42
+            )
+            train_idx, test_idx = next(splitter.split(X_arr, y_arr))
+        else:
+            perm = np.random.RandomState(42).permutation(len(y_arr))
+            cut = int(len(perm) * 0.75)
+            train_idx, test_idx = perm[:cut], perm[cut:]
+        X_train, X_test = X_arr[train_idx], X_arr[test_idx]
+        y_train, y_test = y_arr[train_idx], y_arr[test_idx]
+        self.classifier.fit(X_train, y_train)
+        self.is_trained = True
+
+        # One predict_proba pass covers both metrics: labels are a
+        # threshold over the probabilities, not a second tree traversal
+        y_prob = self.classifier.predict_proba(X_test)[:, 1]
+        y_pred = (y_prob >= 0.5).astype(np.int8)
+        try:
+            auc = roc_auc_score(y_test, y_prob)
+        except ValueError:
+            auc = float("nan")
+        report = classification_report(
+            y_test, y_pred, output_dict=True, zero_division=0
+        )
+        logger.info(f"Trained {self.model_type}, holdout AUC={auc:.3f}")
+        return {"model_type": self.model_type, "auc": auc, "report": report}
+
+    def predict(self, features_df: pd.DataFrame) -> np.ndarray:
+        """Failure probability per row of the feature frame."""
+        if not self.is_trained:
+            raise RuntimeError("Model must be trained before prediction")
+        X, _ = self.prepare_data(features_df)
+        X = X.reindex(columns=self.feature_names, fill_value=0)
+        X_input = self.scaler.transform(X) if self.scaler is not None else X
+
+        if self.model_type == "xgboost":
+            # inplace_predict skips the per-call DMatrix build; reuse a
+            # float32 buffer so repeated API calls do not reallocate.
+            buf = self._predict_buffer
+            if buf is None or buf.shape != X.shape:
+                buf = np.empty(X.shape, dtype=np.float32)
+                self._predict_buffer = buf
+            np.copyto(buf, np.asarray(X_input), casting="unsafe")
+            return self.classifier.get_booster().inplace_predict(buf)
+        return self.classifier.predict_proba(X_input)[:, 1]
+
+    @staticmethod
+    def _categorize_risk(probability: float) -> str:
+        """Single-probability categorization; batch paths use np.select."""
+        if probability >= 0.75:
+            return "CRITICAL"
+        if probability >= 0.5:
+            return "HIGH"
+        if probability >= 0.25:
+            return "MEDIUM"
+        return "LOW"
+
+    def predict_time_window(
+        self, features_df: pd.DataFrame, time_window: str = "30d"
+    ) -> List[Dict[str, Any]]:
+        """Formatted per-building predictions for the API."""
+        probs = self.predict(features_df)
+        prediction_date = datetime.now().isoformat()
+
+        # Whole-vector derivations; the loop below only assembles dicts
+        ids = features_df["id"].to_numpy()
+        names = (
+            features_df["name"].to_numpy() if "name" in features_df else ids
+        )
+        if "days_since_last_issue" in features_df:
+            days = features_df["days_since_last_issue"].to_numpy(
+                dtype=np.float64
+            )
+        else:
+            days = np.full(len(features_df), 30.0)
+        codes = np.select(
+            [probs >= 0.75, probs >= 0.5, probs >= 0.25], [3, 2, 1], default=0
+        )
+        levels = _RISK_LABELS[codes].tolist()
+        mult = np.select([probs > 0.7, probs > 0.5], [0.5, 0.7], default=1.0)
+        cap = np.select([probs > 0.7, probs > 0.5], [30, 45], default=60)
+        estimated_days = np.minimum((days * mult).astype(np.int64), cap)
+        confidence = np.clip(np.abs(probs - 0.5) * 2.0, 0.0, 1.0)
+
+        predictions = []
+        for i, building_id in enumerate(ids):
+            prob = float(probs[i])
+            predictions.append(
+                {
+                    "building_id": building_id,
+                    "building_name": names[i],
+                    "failure_probability": round(prob, 4),
+                    "failure_risk_level": levels[i],
+                    "estimated_days_to_failure": int(estimated_days[i]),
+                    "confidence": round(float(confidence[i]), 4),
+                    "time_window": time_window,
+                    "prediction_date": prediction_date,
+                }
+            )
+        return predictions
+
+    def get_feature_importance(self) -> Optional[pd.DataFrame]:
+        if not self.is_trained:
+            return None
+        return pd.DataFrame(
+            {
+                "feature": self.feature_names,
+                "importance": self.classifier.feature_importances_,
+            }
+        ).sort_values("importance", ascending=False)
+
+    def plot_feature_importance(self, path: str, top_n: int = 15) -> None:
+        importance = self.get_feature_importance()
+        if importance is None:
+            return
+        # Plotting libraries cost hundreds of ms to import; keep them
+        # out of the train/predict path and force the headless backend
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        fig, ax = plt.subplots(figsize=(8, 6))
+        sns.barplot(
+            data=importance.head(top_n), x="importance", y="feature", ax=ax
+        )
+        ax.set_title(f"Feature importance ({self.model_type})")
+        fig.tight_layout()
+        fig.savefig(path)
+        plt.close(fig)
+
+    def save_model(self, model_path: str, scaler_path: str) -> None:
+        if self.model_type == "xgboost":
+            # Native UBJ is version-portable and far faster to load
+            # than unpickling the sklearn wrapper
+            model_path = os.path.splitext(model_path)[0] + ".ubj"
+            self.classifier.save_model(model_path)
+        else:
+            joblib.dump(self.classifier, model_path)
+        joblib.dump(
+            {"scaler": self.scaler, "feature_names": self.feature_names},
+            scaler_path,
+        )
+        logger.info(f"Saved {self.model_type} model to {model_path}")
+
+    def load_model(self, model_path: str, scaler_path: str) -> None:
+        ubj_path = os.path.splitext(model_path)[0] + ".ubj"
+        if self.model_type == "xgboost" and os.path.exists(ubj_path):
+            self.classifier = XGBClassifier()
+            self.classifier.load_model(ubj_path)
+        else:
+            # Legacy joblib pickle (and the random_forest path)
+            self.classifier = joblib.load(model_path)
+        bundle = joblib.load(scaler_path)
+        self.scaler = bundle.get("scaler")
+        self.feature_names = bundle["feature_names"]
+        self.is_trained = True
+        if self.model_type == "xgboost":
+            # Persisted boosters may carry nthread=1; scoring runs on
+            # every prediction request, so use all cores.
+            self.classifier.get_booster().set_param(
+                {"nthread": os.cpu_count()}
+            )
+        logger.info(f"Loaded {self.model_type} model from {model_path}")
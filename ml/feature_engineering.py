@@ -0,0 +1,333 @@
+"""
+Feature Engineering for Failure Prediction
+Builds per-building and per-category features from raw issue reports.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit, prange
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    import polars as pl
+
+    POLARS_AVAILABLE = True
+except ImportError:
+    POLARS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(parallel=True, nogil=True, cache=True)
+    def _grouped_sum(values, starts, ends):
+        """Sum `values` over contiguous [start, end) slices, one per group."""
+        out = np.empty(starts.shape[0])
+        for g in prange(starts.shape[0]):
+            total = 0.0
+            for j in range(starts[g], ends[g]):
+                total += values[j]
+            out[g] = total
+        return out
+
+    # Trigger compilation at import so the first request does not pay it
+    _grouped_sum(
+        np.zeros(1), np.zeros(1, dtype=np.int64), np.ones(1, dtype=np.int64)
+    )
+
+
+class FeatureEngineer:
+    """Turns (buildings_df, issues_df) into model-ready feature frames."""
+
+    def __init__(self, reference_time: Optional[datetime] = None):
+        self.reference_time = reference_time or datetime.now()
+
+    @staticmethod
+    def _ensure_datetime(issues_df: pd.DataFrame) -> pd.DataFrame:
+        """Normalize dtypes once; already-normalized frames pass through
+        without a copy so nested calls share one conversion.
+
+        created_at is parsed to naive-UTC datetime64 — tz-aware input
+        (the Firestore loader's frames and Parquet exports) is folded to
+        UTC and stripped, since all downstream arithmetic runs against
+        naive datetime.now() — and the low-cardinality status/category
+        strings become categoricals, so later equality and isin checks
+        compare integer codes instead of strings.
+        """
+        created = issues_df["created_at"]
+        if not pd.api.types.is_datetime64_any_dtype(created):
+            created = pd.to_datetime(created, utc=True).dt.tz_localize(None)
+        elif getattr(created.dtype, "tz", None) is not None:
+            created = created.dt.tz_convert("UTC").dt.tz_localize(None)
+        else:
+            created = None
+        cat_cols = [
+            col
+            for col in ("status", "category")
+            if col in issues_df.columns
+            and not isinstance(issues_df[col].dtype, pd.CategoricalDtype)
+        ]
+        if created is None and not cat_cols:
+            return issues_df
+        converted = issues_df.copy(deep=False)
+        if created is not None:
+            converted["created_at"] = created
+        for col in cat_cols:
+            converted[col] = converted[col].astype("category")
+        return converted
+
+    def engineer_building_features(
+        self, buildings_df: pd.DataFrame, issues_df: pd.DataFrame
+    ) -> pd.DataFrame:
+        """Per-building issue statistics and rolling-window counts."""
+        issues_df = self._ensure_datetime(issues_df)
+        now = self.reference_time
+
+        # One hashed group pass produces every base statistic; no
+        # per-building boolean scan over the issues frame. Polars runs
+        # the same aggregation on all cores when it is installed.
+        if POLARS_AVAILABLE and len(issues_df) > 0:
+            agg = self._polars_base_agg(issues_df)
+        else:
+            agg = (
+                issues_df.assign(
+                    is_open=issues_df["status"].isin(["open", "in_progress"])
+                )
+                .groupby("building_id")
+                .agg(
+                    total_issues=("severity", "size"),
+                    open_issues=("is_open", "sum"),
+                    avg_severity=("severity", "mean"),
+                    max_severity=("severity", "max"),
+                    last_issue=("created_at", "max"),
+                )
+            )
+        features = buildings_df[["id", "name"]].merge(
+            agg, left_on="id", right_index=True, how="left"
+        )
+        features["days_since_last_issue"] = (
+            (now - features.pop("last_issue")).dt.days.fillna(999).astype(int)
+        )
+        for col, fill in (
+            ("total_issues", 0),
+            ("open_issues", 0),
+            ("avg_severity", 0.0),
+            ("max_severity", 0),
+        ):
+            features[col] = features[col].fillna(fill)
+
+        # Issue ages and severities are extracted once as plain arrays;
+        # every remaining computation shares them without copies
+        days_ago = (
+            (now - issues_df["created_at"]).dt.total_seconds().to_numpy()
+            / 86400.0
+        )
+        severity = issues_df["severity"].to_numpy()
+        building_ids = issues_df["building_id"].to_numpy()
+
+        # All rolling windows are boolean masks over the shared age
+        # array, reduced in one grouped sum
+        window_flags = pd.DataFrame(
+            {f"issues_last_{w}d": days_ago <= w for w in (7, 30, 90)}
+        )
+        window_counts = window_flags.groupby(building_ids).sum()
+        for col in window_counts.columns:
+            features[col] = (
+                features["id"].map(window_counts[col]).fillna(0).astype(int)
+            )
+
+        # Per-window severity means: NaN-mask severities outside each
+        # window, then one grouped nan-mean over all three columns
+        sev_f32 = severity.astype(np.float32)
+        window_sev = pd.DataFrame(
+            {
+                f"avg_severity_last_{w}d": np.where(
+                    days_ago <= w, sev_f32, np.nan
+                )
+                for w in (7, 30, 90)
+            }
+        )
+        window_means = window_sev.groupby(building_ids).mean()
+        for col in window_means.columns:
+            features[col] = (
+                features["id"].map(window_means[col]).fillna(0.0)
+            )
+
+        # Decay weights are computed for the whole frame at once and
+        # reduced per building in a single grouped sum
+        decayed = self._recency_weights(days_ago, severity)
+        if NUMBA_AVAILABLE and len(issues_df) > 0:
+            # Sort by building once; each group is then a contiguous
+            # slice the nogil kernel can reduce in parallel
+            codes, uniques = pd.factorize(issues_df["building_id"], sort=True)
+            order = np.argsort(codes, kind="stable")
+            group_range = np.arange(len(uniques))
+            sorted_codes = codes[order]
+            starts = np.searchsorted(sorted_codes, group_range, side="left")
+            ends = np.searchsorted(sorted_codes, group_range, side="right")
+            sums = _grouped_sum(decayed[order], starts, ends)
+            recency = pd.Series(sums, index=uniques)
+        else:
+            recency = pd.Series(decayed).groupby(building_ids).sum()
+        features["recency_weighted_score"] = (
+            features["id"].map(recency).fillna(0.0)
+        )
+
+        # Narrow dtypes: counts fit comfortably in int16 and severities
+        # and scores in float32, halving (or better) the bandwidth of
+        # every downstream groupby, merge and model fit
+        count_cols = [
+            "total_issues",
+            "open_issues",
+            "days_since_last_issue",
+            "issues_last_7d",
+            "issues_last_30d",
+            "issues_last_90d",
+        ]
+        features[count_cols] = features[count_cols].astype(np.int16)
+        features["max_severity"] = features["max_severity"].astype(np.int8)
+        float_cols = [
+            c
+            for c in features.columns
+            if "avg_severity" in c or c == "recency_weighted_score"
+        ]
+        features[float_cols] = features[float_cols].astype(np.float32)
+        return features
+
+    @staticmethod
+    def _polars_base_agg(issues_df: pd.DataFrame) -> pd.DataFrame:
+        """Base per-building statistics through polars' parallel engine;
+        returns the same frame shape as the pandas groupby."""
+        out = (
+            pl.from_pandas(
+                issues_df[["building_id", "status", "severity", "created_at"]]
+            )
+            .lazy()
+            .group_by("building_id")
+            .agg(
+                total_issues=pl.len(),
+                open_issues=pl.col("status")
+                .is_in(["open", "in_progress"])
+                .sum(),
+                avg_severity=pl.col("severity").mean(),
+                max_severity=pl.col("severity").max(),
+                last_issue=pl.col("created_at").max(),
+            )
+            .collect()
+        )
+        return out.to_pandas().set_index("building_id")
+
+    @staticmethod
+    def _recency_weights(
+        age_days: np.ndarray,
+        severity: np.ndarray,
+        half_life_days: float = 30.0,
+    ) -> np.ndarray:
+        """Exponentially decayed issue weight: recent issues count more.
+
+        Takes plain arrays so batch callers can reuse extracted columns
+        without per-call frame copies or .dt dispatch.
+        """
+        return np.exp2(-age_days / half_life_days) * (severity / 5.0)
+
+    def _calculate_recency_weighted_score(
+        self, building_issues: pd.DataFrame, half_life_days: float = 30.0
+    ) -> float:
+        """Decayed-weight sum for one building's issues."""
+        if len(building_issues) == 0:
+            return 0.0
+        created = building_issues["created_at"]
+        if not pd.api.types.is_datetime64_any_dtype(created):
+            created = pd.to_datetime(created)
+        age_days = (
+            self.reference_time - created
+        ).dt.total_seconds().to_numpy() / 86400.0
+        return float(
+            self._recency_weights(
+                age_days,
+                building_issues["severity"].to_numpy(),
+                half_life_days,
+            ).sum()
+        )
+
+    def engineer_category_features(
+        self, buildings_df: pd.DataFrame, issues_df: pd.DataFrame
+    ) -> pd.DataFrame:
+        """Per-building counts for each issue category."""
+        issues_df = self._ensure_datetime(issues_df)
+
+        # One crosstab replaces the nested building x category filter loop
+        counts = (
+            pd.crosstab(issues_df["building_id"], issues_df["category"])
+            .add_prefix("category_")
+            .add_suffix("_count")
+        )
+        features = buildings_df[["id"]].merge(
+            counts, left_on="id", right_index=True, how="left"
+        )
+        count_cols = features.columns.difference(["id"])
+        features[count_cols] = (
+            features[count_cols].fillna(0).astype(np.int16)
+        )
+        return features
+
+    def create_training_dataset(
+        self,
+        buildings_df: pd.DataFrame,
+        issues_df: pd.DataFrame,
+        label_window_days: int = 30,
+    ) -> pd.DataFrame:
+        """
+        Full feature frame plus a binary `will_fail` label: whether the
+        building sees a severe issue within the label window after the
+        feature cutoff.
+
+        The cutoff sits one label window before reference_time and the
+        feature pass only sees issues up to it, so the label covers
+        historical data the features could not peek at. Anchoring the
+        window at reference_time itself would leave it empty — no past
+        issue can fall after "now" — and will_fail all-zero.
+        """
+        issues_df = self._ensure_datetime(issues_df)
+
+        cutoff = self.reference_time - timedelta(days=label_window_days)
+        history = issues_df[issues_df["created_at"] <= cutoff]
+        as_of_cutoff = FeatureEngineer(reference_time=cutoff)
+        features = as_of_cutoff.engineer_building_features(
+            buildings_df, history
+        )
+        category_features = as_of_cutoff.engineer_category_features(
+            buildings_df, history
+        )
+        features = features.merge(category_features, on="id", how="left")
+
+        # One mask over the whole frame finds every failing building;
+        # each label is then a set membership test
+        horizon = cutoff + timedelta(days=label_window_days)
+        in_window = (
+            (issues_df["created_at"] > cutoff)
+            & (issues_df["created_at"] <= horizon)
+            & (issues_df["severity"] >= 4)
+        )
+        failed = set(issues_df.loc[in_window, "building_id"])
+        features["will_fail"] = (
+            features["id"].isin(failed).astype(np.int8)
+        )
+
+        numeric = features.select_dtypes(include=[np.number]).columns
+        features[numeric] = features[numeric].fillna(0)
+        logger.info(
+            f"Built training dataset: {features.shape[0]} buildings x "
+            f"{features.shape[1]} columns"
+        )
+        return features
@@ -0,0 +1,520 @@
+"""
+Risk Probability Model
+Combines failure, anomaly, frequency and recency component scores into
+a single calibrated risk probability per building.
+"""
+
+import functools
+import json
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+try:
+    from numba import njit, prange
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+from data_loader import CATEGORIES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEIGHTS = {
+    "failure": 0.40,
+    "anomaly": 0.25,
+    "frequency": 0.20,
+    "recency": 0.15,
+}
+
+RISK_THRESHOLDS = [
+    (0.75, "CRITICAL"),
+    (0.55, "HIGH"),
+    (0.35, "MEDIUM"),
+    (0.0, "LOW"),
+]
+
+# Ascending views of RISK_THRESHOLDS for branchless level lookup:
+# np.digitize(p, _LEVEL_THRESHOLDS) indexes straight into _LEVELS
+_LEVEL_THRESHOLDS = np.array([t for t, _ in reversed(RISK_THRESHOLDS[:-1])])
+_LEVELS = np.array([level for _, level in reversed(RISK_THRESHOLDS)])
+
+# Batch sizes below this are scored inline; above it the work is split
+# into chunks and spread across cores
+_PARALLEL_MIN_BATCH = 4096
+_PARALLEL_CHUNK = 1024
+
+
+if NUMBA_AVAILABLE:
+
+    @functools.lru_cache(maxsize=8)
+    def _specialized_fused(wf, wa, wfr, wre):
+        """Compile a fused score kernel with the weights baked in as
+        constants: LLVM folds the four multiplies against literals
+        instead of loading runtime arguments every iteration. Cached per
+        weight tuple so every default-weight instance shares one
+        compilation."""
+
+        @njit(parallel=True, fastmath=True)
+        def _fused_score(failure, anomaly, frequency, recency):
+            n = failure.shape[0]
+            probs = np.empty(n)
+            codes = np.empty(n, dtype=np.int8)
+            for i in prange(n):
+                c = (
+                    wf * failure[i]
+                    + wa * anomaly[i]
+                    + wfr * frequency[i]
+                    + wre * recency[i]
+                )
+                x = (c - 0.5) * 6.0
+                e = math.exp(-abs(x))
+                p = 1.0 / (1.0 + e) if x >= 0 else e / (1.0 + e)
+                probs[i] = p
+                codes[i] = (
+                    3 if p >= 0.75 else 2 if p >= 0.55 else 1 if p >= 0.35 else 0
+                )
+            return probs, codes
+
+        # Compile eagerly so request paths never pay the JIT cost
+        _fused_score(np.zeros(1), np.zeros(1), np.zeros(1), np.zeros(1))
+        return _fused_score
+
+    _specialized_fused(
+        DEFAULT_WEIGHTS["failure"],
+        DEFAULT_WEIGHTS["anomaly"],
+        DEFAULT_WEIGHTS["frequency"],
+        DEFAULT_WEIGHTS["recency"],
+    )
+
+
+def _score_chunk(
+    failure: np.ndarray,
+    anomaly: np.ndarray,
+    frequency: np.ndarray,
+    recency: np.ndarray,
+    w_vec: np.ndarray,
+) -> np.ndarray:
+    """Weighted combination plus sigmoid for one contiguous slice.
+
+    The combination is a single gemv against the precomputed weight
+    vector, so BLAS handles the multiply-adds in one SIMD pass.
+    """
+    combined = np.stack((failure, anomaly, frequency, recency), axis=1) @ w_vec
+    return RiskProbabilityModel._stable_sigmoid((combined - 0.5) * 6.0)
+
+
+class RiskProbabilityModel:
+    """Weighted-component risk scorer with report helpers."""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.is_trained = False
+        self.training_summary: Dict[str, Any] = {}
+        # Weights never change after init, so specialize once: a dense
+        # vector for the BLAS path and, when numba is present, a kernel
+        # with the weights constant-folded into the machine code
+        self._w_vec = np.array(
+            [
+                self.weights["failure"],
+                self.weights["anomaly"],
+                self.weights["frequency"],
+                self.weights["recency"],
+            ]
+        )
+        if NUMBA_AVAILABLE:
+            self._fused_score = _specialized_fused(*map(float, self._w_vec))
+
+    @staticmethod
+    def sigmoid(x: float) -> float:
+        # Stable branch-split form: exponentiate only the negative
+        # magnitude so large |x| cannot overflow, one exp per call
+        e = math.exp(-abs(x))
+        return 1.0 / (1.0 + e) if x >= 0 else e / (1.0 + e)
+
+    @staticmethod
+    def _stable_sigmoid(x: np.ndarray) -> np.ndarray:
+        """Vectorized sigmoid with a single exp per lane and no
+        overflow for extreme inputs."""
+        e = np.exp(-np.abs(x))
+        return np.where(x >= 0, 1.0, e) / (1.0 + e)
+
+    @staticmethod
+    def _categorize_risk(probability: float) -> str:
+        return str(_LEVELS[np.digitize(probability, _LEVEL_THRESHOLDS)])
+
+    def calculate_building_risk(
+        self,
+        failure_score: float,
+        anomaly_score: float,
+        frequency_score: float,
+        recency_score: float,
+        computed_at: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Combine component scores (each in [0, 1]) for one building.
+
+        Callers scoring a fleet in a loop should pass a shared
+        `computed_at` so the batch carries one timestamp instead of one
+        clock read and isoformat per building.
+        """
+        combined = (
+            self.weights["failure"] * failure_score
+            + self.weights["anomaly"] * anomaly_score
+            + self.weights["frequency"] * frequency_score
+            + self.weights["recency"] * recency_score
+        )
+        # Spread the weighted sum away from the centre before squashing
+        probability = self.sigmoid((combined - 0.5) * 6.0)
+        return {
+            "risk_probability": round(probability, 4),
+            "risk_level": self._categorize_risk(probability),
+            "failure_component": round(failure_score, 4),
+            "anomaly_component": round(anomaly_score, 4),
+            "frequency_component": round(frequency_score, 4),
+            "recency_component": round(recency_score, 4),
+            "computed_at": computed_at or datetime.now().isoformat(),
+        }
+
+    def calculate_building_risk_batch(
+        self,
+        building_ids: List[str],
+        failure_scores,
+        anomaly_scores,
+        frequency_scores,
+        recency_scores,
+    ) -> Dict[str, Dict[str, Any]]:
+        """Vectorized equivalent of calculate_building_risk for a fleet.
+
+        All arithmetic — the weighted combination, the sigmoid squash
+        and the level thresholds — runs as whole-array operations; the
+        per-building dicts are only materialized once at the end.
+        """
+        # float32 is plenty for probabilities in [0, 1] against coarse
+        # thresholds, and halves the bytes every pass below touches
+        failure = np.asarray(failure_scores, dtype=np.float32)
+        anomaly = np.asarray(anomaly_scores, dtype=np.float32)
+        frequency = np.asarray(frequency_scores, dtype=np.float32)
+        recency = np.asarray(recency_scores, dtype=np.float32)
+
+        n = failure.shape[0]
+        if NUMBA_AVAILABLE and n > 0:
+            probs, codes = self._fused_score(failure, anomaly, frequency, recency)
+            levels = _LEVELS[codes]
+        elif n >= _PARALLEL_MIN_BATCH:
+            # numpy releases the GIL inside the ufuncs, so threads keep
+            # all cores busy without pickling the chunks
+            bounds = range(0, n, _PARALLEL_CHUNK)
+            parts = joblib.Parallel(n_jobs=-1, prefer="threads")(
+                joblib.delayed(_score_chunk)(
+                    failure[i : i + _PARALLEL_CHUNK],
+                    anomaly[i : i + _PARALLEL_CHUNK],
+                    frequency[i : i + _PARALLEL_CHUNK],
+                    recency[i : i + _PARALLEL_CHUNK],
+                    self._w_vec,
+                )
+                for i in bounds
+            )
+            probs = np.concatenate(parts)
+            levels = _LEVELS[np.digitize(probs, _LEVEL_THRESHOLDS)]
+        else:
+            probs = _score_chunk(
+                failure, anomaly, frequency, recency, self._w_vec
+            )
+            levels = _LEVELS[np.digitize(probs, _LEVEL_THRESHOLDS)]
+
+        # Round in float64 so the narrow storage type does not leak
+        # representation noise into the output dicts
+        probs_r = np.round(probs.astype(np.float64), 4)
+        failure_r = np.round(failure.astype(np.float64), 4)
+        anomaly_r = np.round(anomaly.astype(np.float64), 4)
+        frequency_r = np.round(frequency.astype(np.float64), 4)
+        recency_r = np.round(recency.astype(np.float64), 4)
+        computed_at = datetime.now().isoformat()
+        return {
+            bid: {
+                "risk_probability": float(p),
+                "risk_level": lvl,
+                "failure_component": float(f),
+                "anomaly_component": float(a),
+                "frequency_component": float(fr),
+                "recency_component": float(re),
+                "computed_at": computed_at,
+            }
+            for bid, p, lvl, f, a, fr, re in zip(
+                building_ids,
+                probs_r,
+                levels.tolist(),
+                failure_r,
+                anomaly_r,
+                frequency_r,
+                recency_r,
+            )
+        }
+
+    def calculate_category_risk(self, issues_df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Risk score per issue category from severity/openness/recency."""
+        if issues_df is None or issues_df.empty:
+            return []
+        # All per-category metrics come from grouped reductions instead
+        # of re-filtering the frame once per category. Frames that
+        # arrive pre-parsed skip the string-to-datetime pass entirely;
+        # cache=True dedupes repeated timestamp strings when parsing.
+        created = issues_df["created_at"]
+        if not pd.api.types.is_datetime64_any_dtype(created):
+            created = pd.to_datetime(created, cache=True, utc=True)
+        if getattr(created.dtype, "tz", None) is not None:
+            # Fold tz-aware input to naive UTC so the cutoff comparison
+            # against datetime.now() stays valid
+            created = created.dt.tz_convert("UTC").dt.tz_localize(None)
+        recent_cutoff = datetime.now() - timedelta(days=30)
+
+        # Grouping on a fixed categorical compares integer codes, and
+        # observed=False materializes a zero row for every known
+        # category — quiet ones report zero risk instead of being
+        # silently absent
+        cat = issues_df["category"]
+        if not isinstance(cat.dtype, pd.CategoricalDtype):
+            extra = pd.unique(cat[~cat.isin(CATEGORIES)])
+            cat = pd.Categorical(cat, categories=list(CATEGORIES) + list(extra))
+
+        # The three indicator masks are computed once over the whole
+        # frame and reduced together in a single grouped agg
+        indicators = pd.DataFrame(
+            {
+                "is_severe": issues_df["severity"] >= 4,
+                "is_open": issues_df["status"].isin(["open", "in_progress"]),
+                "is_recent": created >= recent_cutoff,
+            }
+        )
+        agg = indicators.groupby(cat, observed=False).agg(
+            total=("is_severe", "size"),
+            severe=("is_severe", "sum"),
+            n_open=("is_open", "sum"),
+            recent=("is_recent", "sum"),
+        )
+        n = agg["total"]
+        severe = agg["severe"]
+        open_ = agg["n_open"]
+        recent = agg["recent"]
+
+        safe_n = n.where(n > 0, 1)
+        scores = (
+            0.4 * (severe / safe_n)
+            + 0.3 * (open_ / safe_n)
+            + 0.3 * np.minimum(1.0, recent / 20)
+        )
+        category_risks = [
+            {
+                "category": category,
+                "risk_score": round(float(scores[category]), 4),
+                "risk_level": self._categorize_risk(float(scores[category])),
+                "total_issues": int(n[category]),
+                "severe_issues": int(severe[category]),
+                "open_issues": int(open_[category]),
+                "recent_issues": int(recent[category]),
+            }
+            for category in n.index
+        ]
+        category_risks.sort(key=lambda c: c["risk_score"], reverse=True)
+        return category_risks
+
+    def calculate_zone_risk(
+        self, buildings_df: pd.DataFrame, building_risks: Dict[str, Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Average building risk per campus zone."""
+        if not building_risks:
+            return []
+        # One merge aligns probabilities with buildings, one groupby
+        # reduces per zone — no per-row iteration
+        br_df = pd.DataFrame(
+            {
+                "id": list(building_risks),
+                "risk_probability": [
+                    r["risk_probability"] for r in building_risks.values()
+                ],
+            }
+        )
+        merged = buildings_df.merge(br_df, on="id", how="inner")
+        if "zone" in merged.columns:
+            zones = merged["zone"].fillna("unknown")
+        else:
+            zones = pd.Series("unknown", index=merged.index)
+
+        # Precomputed indicator column: the critical count per zone is
+        # then a plain grouped sum alongside the other reductions
+        merged["is_crit"] = (
+            merged["risk_probability"] >= _LEVEL_THRESHOLDS[-1]
+        )
+        agg = (
+            merged.groupby(zones)
+            .agg(
+                avg_risk=("risk_probability", "mean"),
+                max_risk=("risk_probability", "max"),
+                n_buildings=("risk_probability", "size"),
+                n_critical=("is_crit", "sum"),
+            )
+            .sort_values("avg_risk", ascending=False)
+        )
+        zone_levels = _LEVELS[
+            np.digitize(agg["avg_risk"].to_numpy(), _LEVEL_THRESHOLDS)
+        ]
+        return [
+            {
+                "zone": zone,
+                "avg_risk": round(float(row.avg_risk), 4),
+                "max_risk": round(float(row.max_risk), 4),
+                "risk_level": str(level),
+                "n_buildings": int(row.n_buildings),
+                "n_critical": int(row.n_critical),
+            }
+            for zone, level, row in zip(
+                agg.index, zone_levels, agg.itertuples(index=False)
+            )
+        ]
+
+    def prioritize_buildings(
+        self, building_risks: Dict[str, Dict[str, Any]], limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Top-N buildings by risk probability."""
+        if not building_risks:
+            return []
+        # Partition out the top N and sort only those, instead of
+        # sorting the whole fleet for a handful of rows
+        ids = list(building_risks)
+        probs = np.fromiter(
+            (building_risks[bid]["risk_probability"] for bid in ids),
+            dtype=np.float64,
+            count=len(ids),
+        )
+        k = min(limit, len(ids))
+        top = np.argpartition(-probs, k - 1)[:k]
+        top = top[np.argsort(-probs[top], kind="stable")]
+        return [{"building_id": ids[i], **building_risks[ids[i]]} for i in top]
+
+    def _generate_recommendations(self, br_df: pd.DataFrame) -> List[str]:
+        if br_df.empty:
+            return []
+        recommendations = []
+        # One columnar reduction yields all three component means
+        means = br_df[
+            ["failure_component", "anomaly_component", "frequency_component"]
+        ].mean()
+        avg_failure = means["failure_component"]
+        avg_anomaly = means["anomaly_component"]
+        avg_frequency = means["frequency_component"]
+        if avg_failure > 0.5:
+            recommendations.append(
+                "Fleet-wide failure risk is elevated; schedule preventive "
+                "maintenance for high-risk buildings"
+            )
+        if avg_anomaly > 0.5:
+            recommendations.append(
+                "Unusual reporting patterns detected across campus; review "
+                "recent anomaly alerts"
+            )
+        if avg_frequency > 0.5:
+            recommendations.append(
+                "Issue frequency is high; consider additional maintenance staff"
+            )
+        return recommendations
+
+    def generate_risk_report(
+        self,
+        building_risks: Dict[str, Dict[str, Any]],
+        buildings_df: Optional[pd.DataFrame] = None,
+    ) -> Dict[str, Any]:
+        """Summary counts, top buildings and recommendations."""
+        n = len(building_risks)
+        if n == 0:
+            report: Dict[str, Any] = {
+                "generated_at": datetime.now().isoformat(),
+                "n_buildings": 0,
+                "avg_risk": 0.0,
+                "critical_count": 0,
+                "high_count": 0,
+                "medium_count": 0,
+                "low_count": 0,
+                "top_buildings": [],
+                "recommendations": [],
+            }
+            if buildings_df is not None:
+                report["zone_risks"] = []
+            return report
+
+        # The dict of dicts becomes one columnar frame that every part
+        # of the report reduces over — counts, means and top-N all run
+        # as vector operations on the same memory
+        br_df = pd.DataFrame.from_dict(building_risks, orient="index")
+        level_counts = br_df["risk_level"].value_counts()
+        # Callers may pass records that already carry a building_id
+        # field; drop it so reset_index can reinstate the column from
+        # the dict keys without colliding
+        top_buildings = (
+            br_df.drop(columns="building_id", errors="ignore")
+            .nlargest(10, "risk_probability")
+            .reset_index(names="building_id")
+            .to_dict("records")
+        )
+        report = {
+            "generated_at": datetime.now().isoformat(),
+            "n_buildings": n,
+            "avg_risk": round(float(br_df["risk_probability"].mean()), 4),
+            "critical_count": int(level_counts.get("CRITICAL", 0)),
+            "high_count": int(level_counts.get("HIGH", 0)),
+            "medium_count": int(level_counts.get("MEDIUM", 0)),
+            "low_count": int(level_counts.get("LOW", 0)),
+            "top_buildings": top_buildings,
+            "recommendations": self._generate_recommendations(br_df),
+        }
+        if buildings_df is not None:
+            report["zone_risks"] = self.calculate_zone_risk(
+                buildings_df, building_risks
+            )
+        return report
+
+    def save_model(self, path: str) -> None:
+        """Persist the model's state as a small JSON document.
+
+        The model is fully described by its weights and training
+        summary, so there is no reason to pickle the whole instance —
+        JSON loads in microseconds and survives class refactors that
+        would break a pickle.
+        """
+        state = {
+            "weights": self.weights,
+            "risk_thresholds": RISK_THRESHOLDS,
+            "is_trained": self.is_trained,
+            "training_summary": self.training_summary,
+        }
+        with open(path, "w") as f:
+            json.dump(state, f, indent=2, default=str)
+        logger.info(f"Saved risk model to {path}")
+
+    @staticmethod
+    def load_model(
+        path: str, mmap_mode: Optional[str] = "r"
+    ) -> "RiskProbabilityModel":
+        """Load a saved model, accepting both the JSON format and
+        legacy joblib pickles written by older deployments."""
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            # Legacy pickle: memory-map any arrays so preforked API
+            # workers share the pages
+            try:
+                model = joblib.load(path, mmap_mode=mmap_mode)
+            except ValueError:
+                model = joblib.load(path)
+        else:
+            model = RiskProbabilityModel(weights=state.get("weights"))
+            model.is_trained = state.get("is_trained", False)
+            model.training_summary = state.get("training_summary", {})
+        logger.info(f"Loaded risk model from {path}")
+        return model
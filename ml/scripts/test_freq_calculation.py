@@ -0,0 +1,61 @@
+"""
+Sanity-check the vectorized frequency-score expression.
+
+Evaluates the same formula the risk kernel in api_integration uses —
+freq = min(1, sqrt(n)/10) plus a capped bump for the recent-critical
+ratio — over a grid of issue counts in one shot, and compares it
+against a scalar re-implementation case by case.
+
+Run from ml/:  python scripts/test_freq_calculation.py
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def freq_scores(num_issues: np.ndarray, recent_critical: np.ndarray) -> np.ndarray:
+    """Vectorized frequency component, identical to the kernel math."""
+    num_issues = np.asarray(num_issues, dtype=np.float64)
+    recent_critical = np.asarray(recent_critical, dtype=np.float64)
+    freq = np.minimum(1.0, np.sqrt(num_issues) / 10.0)
+    crit_ratio = np.where(
+        num_issues > 0, recent_critical / np.maximum(num_issues, 1.0), 0.0
+    )
+    return np.minimum(1.0, freq + np.minimum(0.2, crit_ratio * 0.4))
+
+
+def freq_score_scalar(n: int, crit: int) -> float:
+    """Straight-line reference for one building."""
+    f = min(1.0, (n**0.5) / 10.0)
+    if n > 0:
+        f = min(1.0, f + min(0.2, (crit / n) * 0.4))
+    return f
+
+
+def main() -> None:
+    counts = np.array([0, 1, 2, 5, 10, 25, 50, 100, 250, 1000])
+    criticals = np.array([0, 0, 1, 2, 5, 5, 10, 60, 0, 500])
+
+    vectorized = freq_scores(counts, criticals)
+    reference = np.array(
+        [freq_score_scalar(int(n), int(c)) for n, c in zip(counts, criticals)]
+    )
+
+    table = pd.DataFrame(
+        {
+            "num_issues": counts,
+            "recent_critical": criticals,
+            "freq_vectorized": np.round(vectorized, 4),
+            "freq_scalar": np.round(reference, 4),
+        }
+    )
+    print(table.to_string(index=False))
+
+    if np.allclose(vectorized, reference):
+        print("\nOK: vectorized frequency scores match the scalar reference")
+    else:
+        raise SystemExit("MISMATCH between vectorized and scalar scores")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Poll the ML API endpoints concurrently and time the sweep.
+
+A sequential poll pays one full round-trip per endpoint; since the
+workload is pure I/O the requests can overlap almost entirely. Uses
+httpx.AsyncClient with asyncio.gather when httpx is installed, else a
+ThreadPoolExecutor over urllib — either way the endpoints are fetched
+in parallel and the elapsed time is compared against a sequential pass.
+
+Run from ml/ with the API up (python api_integration.py):
+    python scripts/test_recency.py
+"""
+
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import asyncio
+
+    import httpx
+
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+BASE_URL = "http://localhost:5000"
+ENDPOINTS = [
+    "/api/ml/health",
+    "/api/ml/risk",
+    "/api/ml/risk/priority",
+    "/api/ml/risk/category",
+    "/api/ml/risk/summary",
+    "/api/ml/critical-buildings",
+    "/api/ml/high-risk-buildings",
+    "/api/ml/alerts",
+]
+MAX_WORKERS = 8
+TIMEOUT = 10
+
+
+def fetch(url: str) -> dict:
+    """Blocking GET returning parsed JSON, or an error record."""
+    try:
+        with urllib.request.urlopen(url, timeout=TIMEOUT) as resp:
+            return {"url": url, "status": resp.status, "body": json.load(resp)}
+    except urllib.error.HTTPError as exc:
+        return {"url": url, "status": exc.code, "error": str(exc)}
+    except (urllib.error.URLError, OSError) as exc:
+        return {"url": url, "status": None, "error": str(exc)}
+
+
+def fetch_all_threaded(urls: list) -> list:
+    """Overlap the round-trips with a thread pool; urllib releases the
+    GIL while blocked on the socket."""
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        return list(pool.map(fetch, urls))
+
+
+async def _fetch_async(client, url: str) -> dict:
+    try:
+        resp = await client.get(url, timeout=TIMEOUT)
+        return {"url": url, "status": resp.status_code, "body": resp.json()}
+    except httpx.HTTPError as exc:
+        return {"url": url, "status": None, "error": str(exc)}
+
+
+def fetch_all_async(urls: list) -> list:
+    """All requests share one AsyncClient and run under one gather."""
+
+    async def run():
+        async with httpx.AsyncClient() as client:
+            return await asyncio.gather(
+                *[_fetch_async(client, u) for u in urls]
+            )
+
+    return asyncio.run(run())
+
+
+def main() -> None:
+    urls = [BASE_URL + ep for ep in ENDPOINTS]
+
+    start = time.perf_counter()
+    sequential = [fetch(u) for u in urls]
+    seq_elapsed = time.perf_counter() - start
+
+    if all(r["status"] is None for r in sequential):
+        raise SystemExit(
+            f"Could not reach the ML API at {BASE_URL} — start it with "
+            "`python api_integration.py` and re-run"
+        )
+
+    start = time.perf_counter()
+    if HTTPX_AVAILABLE:
+        concurrent = fetch_all_async(urls)
+        mode = "httpx + asyncio.gather"
+    else:
+        concurrent = fetch_all_threaded(urls)
+        mode = f"ThreadPoolExecutor({MAX_WORKERS})"
+    conc_elapsed = time.perf_counter() - start
+
+    for result in concurrent:
+        status = result["status"] if result["status"] else result["error"]
+        print(f"  {result['url']}: {status}")
+    print(f"\nsequential: {seq_elapsed:.3f}s  |  {mode}: {conc_elapsed:.3f}s")
+
+    seq_ok = [r["status"] for r in sequential]
+    conc_ok = [r["status"] for r in concurrent]
+    if seq_ok == conc_ok:
+        print("OK: concurrent sweep returned the same statuses")
+    else:
+        raise SystemExit("MISMATCH between sequential and concurrent sweeps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Train the anomaly detection and failure prediction models.
+
+Fits the Isolation Forest / One-Class SVM pair on per-building
+features, scores every building, runs the spike and temporal detectors,
+and trains the failure classifier — writing model artifacts, result
+CSVs and diagnostic plots under ml/models/ where api_integration
+expects them.
+
+Run from ml/:  python scripts/train_anomaly_model.py
+"""
+
+import logging
+import os
+import sys
+
+import joblib
+import matplotlib
+
+# Headless raster backend: skips GUI-toolkit loading and is the
+# fastest savefig path
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from anomaly_detection import (  # noqa: E402
+    AnomalyDetectionModel,
+    AnomalyFeatureEngineer,
+    detect_spike_anomalies,
+    detect_temporal_anomalies,
+)
+from data_loader import LocalDataLoader  # noqa: E402
+from failure_prediction import FailurePredictionModel  # noqa: E402
+from feature_engineering import FeatureEngineer  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "models")
+
+# Ensemble-probability severity bands, lowest first
+_SEVERITY_BINS = [-np.inf, 0.4, 0.6, 0.8, np.inf]
+_SEVERITY_LABELS = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
+_SEVERITY_COLOR = {
+    "CRITICAL": "red",
+    "HIGH": "orange",
+    "MEDIUM": "yellow",
+    "LOW": "yellow",
+}
+
+# PNG encode time grows steeply with DPI; 150 is plenty for dashboards.
+# Set SKIP_PLOTS=1 to stop after the CSVs.
+_PLOT_DPI = int(os.getenv("PLOT_DPI", "150"))
+
+# Four significant decimals keep the CSVs small and fast to write;
+# pandas otherwise formats float64 at full 17-digit precision
+_CSV_KW = dict(index=False, float_format="%.4f")
+
+
+def train_anomaly_detection_model():
+    """Fit both anomaly detectors and score every building."""
+    os.makedirs(MODELS_DIR, exist_ok=True)
+
+    logger.info("Step 1: Loading data")
+    buildings_df, issues_df = LocalDataLoader.load_sample_data()
+
+    logger.info("Step 2: Engineering features")
+    engineer = FeatureEngineer()
+    features_df = engineer.engineer_building_features(buildings_df, issues_df)
+    category_features = engineer.engineer_category_features(
+        buildings_df, issues_df
+    )
+    features_df = features_df.merge(category_features, on="id", how="left")
+    # The API augments with AnomalyFeatureEngineer's statistics before
+    # scoring; train on the same frame so the persisted scaler expects
+    # exactly the columns served at prediction time
+    features_df = AnomalyFeatureEngineer().engineer_anomaly_features(
+        features_df, issues_df
+    )
+
+    # Index set ops keep the filter vectorized, and the word-boundary
+    # pattern only drops true id/name columns — a plain substring test
+    # would silently discard columns that merely contain "id"
+    numeric_columns = features_df.select_dtypes(include=[np.number]).columns
+    identifier_columns = numeric_columns[
+        numeric_columns.str.contains(r"(?:^|_)(?:id|name)(?:$|_)", regex=True)
+    ]
+    numeric_features = numeric_columns.difference(
+        identifier_columns, sort=False
+    ).tolist()
+    # One contiguous float32 matrix, cleaned in place, shared by both
+    # fits and both scoring passes — no per-call DataFrame conversion,
+    # and loky can memmap it to the fit workers instead of pickling
+    X = np.ascontiguousarray(
+        features_df[numeric_features].to_numpy(dtype=np.float32)
+    )
+    np.nan_to_num(X, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+
+    logger.info("Steps 3+4: Training Isolation Forest and One-Class SVM")
+
+    # The two fits are independent and run on separate cores; wall
+    # clock is max(fit times) instead of their sum
+    def _fit(algorithm):
+        model = AnomalyDetectionModel(algorithm=algorithm, contamination=0.15)
+        metrics = model.train(X, feature_names=numeric_features)
+        return model, metrics
+
+    (if_model, if_metrics), (svm_model, svm_metrics) = joblib.Parallel(
+        n_jobs=2, backend="loky"
+    )(
+        joblib.delayed(_fit)(algorithm)
+        for algorithm in ("isolation_forest", "one_class_svm")
+    )
+    logger.info(f"Isolation Forest: {if_metrics}")
+    logger.info(f"One-Class SVM: {svm_metrics}")
+
+    logger.info("Step 5: Scoring buildings")
+    # X is exactly the matrix each model was fitted on, so the scores
+    # cached by train() are reused instead of re-traversing the forest
+    # and the support vectors
+    if_preds, if_scores, if_probs = (
+        if_model.labels_,
+        if_model.decision_scores_,
+        if_model.decision_probabilities_,
+    )
+    svm_preds, svm_scores, svm_probs = (
+        svm_model.labels_,
+        svm_model.decision_scores_,
+        svm_model.decision_probabilities_,
+    )
+
+    # Hand pandas raw same-length arrays with copy=False: no index
+    # alignment or dtype inference per column, flags as zero-copy int8
+    # views of the comparison masks
+    results_df = pd.DataFrame(
+        {
+            "building_id": features_df["id"].to_numpy(),
+            "building_name": features_df["name"].to_numpy(),
+            "if_anomaly": (if_preds == -1).view(np.int8),
+            "if_score": np.asarray(if_scores),
+            "if_anomaly_probability": np.asarray(if_probs),
+            "svm_anomaly": (svm_preds == -1).view(np.int8),
+            "svm_score": np.asarray(svm_scores),
+            "svm_anomaly_probability": np.asarray(svm_probs),
+            "ensemble_anomaly_probability": (
+                np.asarray(if_probs) + np.asarray(svm_probs)
+            )
+            / 2.0,
+        },
+        copy=False,
+    )
+
+    # One C-level binning pass replaces a Python call per row; the
+    # integer codes also feed the severity tallies below
+    severity_codes = pd.cut(
+        results_df["ensemble_anomaly_probability"].to_numpy(),
+        bins=_SEVERITY_BINS,
+        labels=False,
+        right=False,
+    ).astype(np.intp)
+    results_df["anomaly_severity"] = np.array(_SEVERITY_LABELS)[
+        severity_codes
+    ]
+
+    # Pack both verdicts into one 2-bit code and bincount it: a single
+    # pass yields all four agreement buckets instead of six boolean
+    # reductions
+    verdict_codes = (if_preds == -1).astype(np.uint8) | (
+        (svm_preds == -1).astype(np.uint8) << 1
+    )
+    verdict_counts = np.bincount(verdict_codes, minlength=4)
+    normal = int(verdict_counts[0])
+    agreement = int(verdict_counts[3])
+    disagreement = int(verdict_counts[1] + verdict_counts[2])
+    logger.info(
+        f"Models agree on {agreement} anomalies, disagree on "
+        f"{disagreement}, {normal} buildings look normal"
+    )
+
+    # One bincount over the severity codes replaces three boolean-mask
+    # scans of the probability column
+    severity_counts = np.bincount(severity_codes, minlength=4)
+    critical = int(severity_counts[3])
+    high = int(severity_counts[2])
+    medium = int(severity_counts[1])
+    logger.info(
+        f"Severity: {critical} critical, {high} high, {medium} medium"
+    )
+
+    logger.info("Step 6: Spike detection")
+    spike_anomalies = detect_spike_anomalies(issues_df, buildings_df)
+    logger.info(f"Found {len(spike_anomalies)} spike anomalies")
+
+    logger.info("Step 7: Temporal detection")
+    temporal_anomalies = detect_temporal_anomalies(issues_df, buildings_df)
+    logger.info(f"Found {len(temporal_anomalies)} temporal anomalies")
+
+    logger.info("Step 8: Saving models")
+    if_model.save_model(
+        os.path.join(MODELS_DIR, "anomaly_isolation_forest.pkl"),
+        os.path.join(MODELS_DIR, "anomaly_isolation_forest_scaler.pkl"),
+    )
+    svm_model.save_model(
+        os.path.join(MODELS_DIR, "anomaly_one_class_svm.pkl"),
+        os.path.join(MODELS_DIR, "anomaly_one_class_svm_scaler.pkl"),
+    )
+
+    logger.info("Step 9: Saving results")
+    results_df.to_csv(
+        os.path.join(MODELS_DIR, "anomaly_detection_results.csv"), **_CSV_KW
+    )
+    if spike_anomalies:
+        pd.DataFrame(spike_anomalies).to_csv(
+            os.path.join(MODELS_DIR, "spike_anomalies.csv"), **_CSV_KW
+        )
+    if temporal_anomalies:
+        pd.DataFrame(temporal_anomalies).to_csv(
+            os.path.join(MODELS_DIR, "temporal_anomalies.csv"), **_CSV_KW
+        )
+
+    if os.getenv("SKIP_PLOTS"):
+        logger.info("Step 10: Plotting skipped (SKIP_PLOTS set)")
+        return results_df, spike_anomalies, temporal_anomalies
+
+    logger.info("Step 10: Plotting")
+    fig, axes = plt.subplots(2, 2, figsize=(14, 10))
+    axes[0, 0].hist(results_df["if_anomaly_probability"], bins=20)
+    axes[0, 0].set_title("Isolation Forest anomaly probability")
+    axes[0, 1].hist(results_df["svm_anomaly_probability"], bins=20)
+    axes[0, 1].set_title("One-Class SVM anomaly probability")
+    axes[1, 0].hist(results_df["ensemble_anomaly_probability"], bins=20)
+    axes[1, 0].set_title("Ensemble anomaly probability")
+    axes[1, 1].scatter(
+        results_df["if_anomaly_probability"],
+        results_df["svm_anomaly_probability"],
+        s=12,
+    )
+    axes[1, 1].set_xlabel("Isolation Forest")
+    axes[1, 1].set_ylabel("One-Class SVM")
+    axes[1, 1].set_title("Model agreement")
+    fig.tight_layout()
+    fig.savefig(
+        os.path.join(MODELS_DIR, "anomaly_distributions.png"), dpi=_PLOT_DPI
+    )
+    plt.close(fig)
+
+    top_anomalies = results_df.nlargest(15, "ensemble_anomaly_probability")
+    # Dict-backed .map runs the lookup at C level instead of a Python
+    # conditional per bar
+    colors = (
+        top_anomalies["anomaly_severity"]
+        .map(_SEVERITY_COLOR)
+        .fillna("yellow")
+        .to_numpy()
+    )
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.barh(
+        top_anomalies["building_name"],
+        top_anomalies["ensemble_anomaly_probability"],
+        color=colors,
+    )
+    ax.invert_yaxis()
+    ax.set_xlabel("Ensemble anomaly probability")
+    ax.set_title("Top anomalous buildings")
+    fig.tight_layout()
+    fig.savefig(os.path.join(MODELS_DIR, "top_anomalies.png"), dpi=_PLOT_DPI)
+    plt.close(fig)
+
+    return results_df, spike_anomalies, temporal_anomalies
+
+
+def train_failure_prediction_model():
+    """Fit the failure classifier and write per-building predictions."""
+    os.makedirs(MODELS_DIR, exist_ok=True)
+
+    logger.info("Step 1: Loading data")
+    buildings_df, issues_df = LocalDataLoader.load_sample_data()
+
+    logger.info("Step 2: Building training dataset")
+    engineer = FeatureEngineer()
+    features_df = engineer.create_training_dataset(buildings_df, issues_df)
+
+    logger.info("Step 3: Training failure model")
+    model = FailurePredictionModel()
+    metrics = model.train(features_df)
+    logger.info(f"Failure model metrics: {metrics}")
+
+    logger.info("Step 4: Scoring buildings")
+    probabilities = model.predict(features_df)
+    # Build the frame once and sort its contiguous float column at C
+    # level; the same sorted frame serves the log, the CSV and the
+    # return value
+    predictions_df = pd.DataFrame(
+        {
+            "building_id": features_df["id"].to_numpy(),
+            "building_name": features_df["name"].to_numpy(),
+            "failure_probability": np.asarray(probabilities, dtype=np.float64),
+        }
+    ).sort_values("failure_probability", ascending=False)
+
+    for row in predictions_df.head(10).itertuples(index=False):
+        logger.info(f"  {row.building_name}: {row.failure_probability:.3f}")
+
+    logger.info("Step 5: Saving model and predictions")
+    model.save_model(
+        os.path.join(MODELS_DIR, "failure_model.pkl"),
+        os.path.join(MODELS_DIR, "failure_scaler.pkl"),
+    )
+    predictions_df.to_csv(
+        os.path.join(MODELS_DIR, "failure_predictions.csv"), **_CSV_KW
+    )
+    return predictions_df
+
+
+def main() -> None:
+    train_anomaly_detection_model()
+    train_failure_prediction_model()
+    logger.info("Training complete")
+
+
+if __name__ == "__main__":
+    main()
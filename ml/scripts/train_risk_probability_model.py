@@ -0,0 +1,419 @@
+"""
+Build the composite risk-probability model and score every building.
+
+Combines failure predictions, anomaly scores, issue frequency and
+recency into one calibrated risk probability per building via
+RiskProbabilityModel, then writes the model state, result CSVs and
+summary plots under ml/models/ where api_integration expects them.
+
+Run from ml/:  python scripts/train_risk_probability_model.py
+"""
+
+import hashlib
+import logging
+import os
+import sys
+
+import joblib
+import matplotlib
+import numpy as np
+import pandas as pd
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from anomaly_detection import (  # noqa: E402
+    AnomalyDetectionModel,
+    AnomalyFeatureEngineer,
+)
+from data_loader import (  # noqa: E402
+    CACHE_DIR,
+    FirebaseDataLoader,
+    LocalDataLoader,
+)
+from failure_prediction import FailurePredictionModel  # noqa: E402
+from feature_engineering import FeatureEngineer  # noqa: E402
+from risk_model import RiskProbabilityModel  # noqa: E402
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "models")
+
+# PNG encode cost scales with pixel count; 150 DPI is plenty for
+# dashboards. Set SKIP_PLOTS=1 to stop after the CSVs.
+_PLOT_DPI = int(os.getenv("PLOT_DPI", "150"))
+
+# Report ordering for risk-level tallies, most severe first
+_LEVEL_ORDER = ["CRITICAL", "HIGH", "MEDIUM", "LOW"]
+
+
+def _write_csv(df: pd.DataFrame, path: str) -> None:
+    """CSV write through pyarrow's C++ writer when available."""
+    if PYARROW_AVAILABLE:
+        pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), path)
+    else:
+        df.to_csv(path, index=False)
+
+
+def _features_cache_key(
+    buildings_df: pd.DataFrame, issues_df: pd.DataFrame
+) -> str:
+    """Content hash of both input frames for the feature cache."""
+    return hashlib.sha1(
+        pd.util.hash_pandas_object(issues_df, index=True).values.tobytes()
+        + pd.util.hash_pandas_object(buildings_df, index=True).values.tobytes()
+    ).hexdigest()[:12]
+
+
+def _run_failure(features_df: pd.DataFrame) -> pd.DataFrame:
+    """Failure probabilities per building as an indexed frame."""
+    failure_model = FailurePredictionModel()
+    model_path = os.path.join(MODELS_DIR, "failure_model.pkl")
+    scaler_path = os.path.join(MODELS_DIR, "failure_scaler.pkl")
+    has_model = os.path.exists(model_path) or os.path.exists(
+        os.path.splitext(model_path)[0] + ".ubj"
+    )
+    if not (has_model and os.path.exists(scaler_path)):
+        logger.warning("Failure model not found; failure component is 0")
+        return pd.DataFrame(
+            columns=["failure_probability", "estimated_days_to_failure"]
+        )
+    failure_model.load_model(model_path, scaler_path)
+    failure_predictions = failure_model.predict_time_window(features_df)
+    # Indexed frame instead of a dict of dicts: Step 5 joins it in one
+    # merge rather than B lookups
+    return pd.DataFrame(failure_predictions).set_index("building_id")[
+        ["failure_probability", "estimated_days_to_failure"]
+    ]
+
+
+def _run_anomaly(
+    features_df: pd.DataFrame, issues_df: pd.DataFrame
+) -> pd.DataFrame:
+    """Anomaly probabilities per building as an indexed frame."""
+    if_path = os.path.join(MODELS_DIR, "anomaly_isolation_forest.pkl")
+    if_scaler = os.path.join(
+        MODELS_DIR, "anomaly_isolation_forest_scaler.pkl"
+    )
+    if not (os.path.exists(if_path) and os.path.exists(if_scaler)):
+        logger.warning("Anomaly model not found; anomaly component is 0")
+        return pd.DataFrame(columns=["anomaly_probability"])
+    anomaly_model = AnomalyDetectionModel(algorithm="isolation_forest")
+    anomaly_model.load_model(if_path, if_scaler)
+
+    # The model was trained on the anomaly-augmented frame; rebuild the
+    # same statistics and select the persisted training columns (and
+    # order) so the matrix matches the fitted scaler
+    scoring_df = AnomalyFeatureEngineer().engineer_anomaly_features(
+        features_df, issues_df
+    )
+    cols = anomaly_model.feature_names
+    if not cols or not set(cols) <= set(scoring_df.columns):
+        cols = scoring_df.select_dtypes(include=[np.number]).columns.tolist()
+    # fillna + replace would each copy the full frame; one in-place
+    # nan_to_num over the extracted float32 array does both cleanups in
+    # a single pass at half the bandwidth. detect_anomalies accepts the
+    # raw array and keeps it float32 end to end, so no DataFrame rewrap
+    # (which would cost another copy and a float64 upcast downstream)
+    X = scoring_df[cols].to_numpy(dtype=np.float32)
+    np.nan_to_num(X, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    _, _, anomaly_probs = anomaly_model.detect_anomalies(X)
+    return pd.DataFrame(
+        {"anomaly_probability": anomaly_probs}, index=features_df["id"]
+    )
+
+
+def _run_frequency(
+    issues_df: pd.DataFrame, buildings_df: pd.DataFrame
+) -> pd.DataFrame:
+    """Issue totals, critical counts and frequency scores per building."""
+    # One grouped pass over the issues frame yields both counts for
+    # every building; reindexing against the building list zero-fills
+    # the quiet ones. The aggregation only needs two columns; a narrow
+    # frame with int8 severity flags and categorical building ids keeps
+    # the grouped scan on integer codes instead of wide rows and string
+    # hashes
+    issue_counts = pd.DataFrame(
+        {
+            "building_id": issues_df["building_id"].astype("category"),
+            "is_critical": (issues_df["severity"] >= 4).astype(np.int8),
+        }
+    )
+    grouped_counts = (
+        issue_counts.groupby("building_id", sort=False, observed=True)
+        .agg(total=("is_critical", "size"), critical=("is_critical", "sum"))
+        .reindex(buildings_df["id"], fill_value=0)
+    )
+    total_issues = grouped_counts["total"].to_numpy(dtype=np.float64)
+    frequency_scores = np.minimum(1.0, np.sqrt(total_issues) / 10.0)
+    frequency_scores = np.minimum(
+        1.0,
+        frequency_scores
+        + np.minimum(
+            0.2,
+            np.where(
+                total_issues > 0,
+                grouped_counts["critical"].to_numpy() /
+                np.maximum(total_issues, 1.0),
+                0.0,
+            )
+            * 0.4,
+        ),
+    )
+    grouped_counts["frequency_score"] = frequency_scores
+    return grouped_counts
+
+
+def train_risk_probability_model():
+    """Score every building and persist the composite risk model."""
+    os.makedirs(MODELS_DIR, exist_ok=True)
+
+    logger.info("Step 1: Loading data")
+    # Deterministic loader choice: probing Firestore inside try/except
+    # pays a connect-and-timeout round trip on every credential-less
+    # dev run. Check the credentials file up front instead.
+    creds = os.getenv("FIREBASE_CREDENTIALS") or os.getenv(
+        "GOOGLE_APPLICATION_CREDENTIALS"
+    )
+    if creds and os.path.exists(creds):
+        loader = FirebaseDataLoader(creds)
+        issues_df = loader.load_issues_with_history()
+        buildings_df = loader.load_building_data()
+    else:
+        logger.info("No Firebase credentials found; using sample data")
+        buildings_df, issues_df = LocalDataLoader.load_sample_data()
+
+    # Semi-join the issues to the current fleet: orphan rows for
+    # buildings no longer present would otherwise be scanned by every
+    # grouped pass below. The set makes isin a hash probe per row
+    # instead of a list scan
+    valid_ids = set(buildings_df["id"])
+    issues_df = issues_df[issues_df["building_id"].isin(valid_ids)]
+
+    # Normalize the issues frame once (datetime parse plus categorical
+    # status/category); each engineering pass and the category-risk
+    # computation below would otherwise redo the conversion over the
+    # largest frame in the pipeline
+    issues_df = FeatureEngineer._ensure_datetime(issues_df)
+
+    # Single id-indexed view of the buildings frame: every per-id
+    # mapping below is one C-level reindex against it instead of a
+    # Python dict build plus per-row lookups
+    bidx = buildings_df.set_index("id")
+
+    # Both the failure predictor and the anomaly detector consume the
+    # same per-building features; engineer them once and share the
+    # frame between Steps 2 and 3. The build is a pure function of the
+    # two input frames, so a Parquet snapshot keyed on their content
+    # hash lets repeated dev runs over unchanged data skip it entirely
+    # (same cache dir and zstd fallback as data_loader's loader cache)
+    cache_path = os.path.join(
+        CACHE_DIR,
+        f"features_{_features_cache_key(buildings_df, issues_df)}.parquet",
+    )
+    if os.path.exists(cache_path):
+        logger.info("Loading engineered features from cache")
+        features_df = pd.read_parquet(cache_path)
+    else:
+        engineer = FeatureEngineer()
+        features_df = engineer.engineer_building_features(
+            buildings_df, issues_df
+        )
+        features_df = features_df.merge(
+            engineer.engineer_category_features(buildings_df, issues_df),
+            on="id",
+            how="left",
+        )
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        try:
+            features_df.to_parquet(cache_path, compression="zstd")
+        except ValueError:
+            features_df.to_parquet(cache_path)
+        except ImportError:
+            logger.warning(
+                "No parquet engine installed; skipping feature cache write"
+            )
+
+    logger.info("Steps 2-4: Failure, anomaly and frequency components")
+    # The three component stages read the same inputs and write
+    # independent frames, so they run concurrently. Threads avoid
+    # pickling the shared frames, and the heavy parts — XGBoost
+    # inference, forest scoring, the grouped aggregation — release the
+    # GIL inside their C loops.
+    failure_df, anomaly_df, freq_df = joblib.Parallel(
+        n_jobs=3, prefer="threads"
+    )(
+        [
+            joblib.delayed(_run_failure)(features_df),
+            joblib.delayed(_run_anomaly)(features_df, issues_df),
+            joblib.delayed(_run_frequency)(issues_df, buildings_df),
+        ]
+    )
+    logger.info("Step 5: Combining risk components")
+    risk_model = RiskProbabilityModel()
+    bids = bidx.index.to_numpy()
+    days_since = (
+        features_df["days_since_last_issue"].to_numpy(dtype=np.float64)
+    )
+    recency_scores = 0.5 ** (days_since / 14.0)
+
+    # One merge chain aligns all three component frames to the building
+    # order in a single wide state frame; missing buildings zero-fill,
+    # the component columns land side by side for the numpy views
+    # below, and the batch call scores the whole fleet at once. When
+    # numba is installed the batch scorer runs its fused
+    # @njit(parallel=True) kernel (probabilities plus integer level
+    # codes in one prange pass, labels via LABELS[codes]); without it
+    # the same math falls back to vectorized numpy
+    state = (
+        buildings_df[["id"]]
+        .merge(failure_df, left_on="id", right_index=True, how="left")
+        .merge(anomaly_df, left_on="id", right_index=True, how="left")
+        .merge(freq_df, left_on="id", right_index=True, how="left")
+        .fillna(0.0)
+    )
+    failure_scores = state["failure_probability"].to_numpy()
+    anomaly_scores = state["anomaly_probability"].to_numpy()
+    frequency_scores = state["frequency_score"].to_numpy()
+    recent_critical = state["critical"].to_numpy(dtype=np.int64)
+    risks_by_building = risk_model.calculate_building_risk_batch(
+        list(bids),
+        failure_scores,
+        anomaly_scores,
+        frequency_scores,
+        recency_scores,
+    )
+
+    # One columnar construction from the batch output — no per-building
+    # dict mutation or list append, and the aligned counts drop in as a
+    # whole array
+    results_df = (
+        pd.DataFrame.from_dict(risks_by_building, orient="index")
+        .rename_axis("building_id")
+        .reset_index()
+    )
+    results_df["recent_critical"] = recent_critical.astype(np.int32)
+    # Risk levels are already vectorized inside the batch scorer
+    # (np.digitize over the shared threshold table); the name lookup is
+    # the remaining per-row map — a left merge against the id-indexed
+    # view runs it as one C-level hash join, no Python dict
+    names = (
+        bidx[["name"]]
+        if "name" in bidx.columns
+        else bidx.index.to_series().to_frame("name")
+    )
+    results_df = results_df.merge(
+        names.rename(columns={"name": "building_name"}),
+        left_on="building_id",
+        right_index=True,
+        how="left",
+    )
+
+    logger.info("Step 6: Category risk")
+    category_risks = risk_model.calculate_category_risk(issues_df)
+
+    logger.info("Step 7: Zone risk")
+    zone_risks = risk_model.calculate_zone_risk(buildings_df, risks_by_building)
+
+    logger.info("Step 8: Saving model")
+    risk_model.save_model(os.path.join(MODELS_DIR, "risk_model.pkl"))
+
+    logger.info("Step 9: Report")
+    # One stable sort serves both the top-10 log and the barh plot, and
+    # counting over a fixed categorical tallies integer codes instead
+    # of hashing object strings — with a deterministic severity order
+    # (zero-count levels included) for the report and the bar chart
+    risk_counts = (
+        results_df["risk_level"]
+        .astype(pd.CategoricalDtype(_LEVEL_ORDER, ordered=True))
+        .value_counts(sort=False)
+    )
+    sorted_df = results_df.sort_values(
+        "risk_probability", ascending=False, kind="stable"
+    )
+    top_10 = sorted_df.head(10)
+    # %-style args defer the string formatting to the handler, so a
+    # silenced logger skips it entirely
+    logger.info("Risk levels: %s", risk_counts.to_dict())
+    logger.info(
+        "Average risk: %.2f%%", results_df["risk_probability"].mean() * 100
+    )
+    for row in top_10.itertuples(index=False):
+        logger.info(
+            "  %s: %.3f (%s)",
+            row.building_name,
+            row.risk_probability,
+            row.risk_level,
+        )
+
+    _write_csv(
+        results_df, os.path.join(MODELS_DIR, "risk_probability_results.csv")
+    )
+    if category_risks:
+        _write_csv(
+            pd.DataFrame(category_risks),
+            os.path.join(MODELS_DIR, "category_risks.csv"),
+        )
+    if zone_risks:
+        _write_csv(
+            pd.DataFrame(zone_risks),
+            os.path.join(MODELS_DIR, "zone_risks.csv"),
+        )
+
+    if os.getenv("SKIP_PLOTS"):
+        logger.info("Step 10: Plotting skipped (SKIP_PLOTS set)")
+        return results_df, category_risks, zone_risks
+
+    logger.info("Step 10: Plotting")
+    fig, axes = plt.subplots(1, 2, figsize=(15, 12))
+    axes[0].hist(results_df["risk_probability"], bins=20)
+    axes[0].set_title("Risk probability distribution")
+    axes[1].bar(risk_counts.index.astype(str), risk_counts.to_numpy())
+    axes[1].set_title("Buildings per risk level")
+    fig.tight_layout()
+    fig.savefig(
+        os.path.join(MODELS_DIR, "risk_distribution.png"),
+        dpi=_PLOT_DPI,
+        bbox_inches="tight",
+    )
+    plt.close(fig)
+
+    fig, ax = plt.subplots(figsize=(15, 12))
+    ax.barh(
+        top_10["building_name"].astype(str),
+        top_10["risk_probability"],
+    )
+    ax.invert_yaxis()
+    ax.set_xlabel("Risk probability")
+    ax.set_title("Highest-risk buildings")
+    fig.tight_layout()
+    fig.savefig(
+        os.path.join(MODELS_DIR, "top_risks.png"),
+        dpi=_PLOT_DPI,
+        bbox_inches="tight",
+    )
+    plt.close(fig)
+
+    return results_df, category_risks, zone_risks
+
+
+def main() -> None:
+    train_risk_probability_model()
+    logger.info("Risk model build complete")
+
+
+if __name__ == "__main__":
+    main()
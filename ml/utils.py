@@ -0,0 +1,408 @@
+"""
+Shared Helpers for the ML Service
+Formats prediction payloads for the API, raises maintenance alerts,
+exports datasets and tracks model performance over time.
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionFormatter:
+    """Turns raw model prediction records into API-shaped payloads."""
+
+    @staticmethod
+    def format_predictions(
+        predictions: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Format a batch of predictions for the frontend.
+
+        The batch is handled as one DataFrame so every derived column
+        (rounding, estimated failure date, action flag) is a single
+        vectorized operation instead of per-record Python work; records
+        are only materialized again at the API boundary.
+        """
+        if not predictions:
+            return []
+        df = pd.DataFrame(predictions)
+        # Integer-code comparisons for the repeated level checks below
+        df["failure_risk_level"] = df["failure_risk_level"].astype(
+            "category"
+        )
+        now = datetime.now()
+
+        df["failureProbability"] = df["failure_probability"].round(4)
+        df["estimatedFailureDate"] = (
+            now + pd.to_timedelta(df["estimated_days_to_failure"], unit="D")
+        ).dt.strftime("%Y-%m-%d")
+        df["actionRequired"] = df["failure_risk_level"].isin(
+            ["CRITICAL", "HIGH"]
+        )
+        df = df.rename(
+            columns={
+                "building_id": "buildingId",
+                "building_name": "buildingName",
+                "failure_risk_level": "riskLevel",
+                "estimated_days_to_failure": "estimatedDaysToFailure",
+            }
+        )
+        keep = [
+            c
+            for c in (
+                "buildingId",
+                "buildingName",
+                "failureProbability",
+                "riskLevel",
+                "estimatedDaysToFailure",
+                "estimatedFailureDate",
+                "confidence",
+                "actionRequired",
+            )
+            if c in df.columns
+        ]
+        return df[keep].to_dict("records")
+
+    @staticmethod
+    def group_by_risk_level(
+        predictions: List[Dict[str, Any]]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Bucket raw prediction records by their risk level."""
+        if not predictions:
+            return {}
+        df = pd.DataFrame(predictions)
+        return {
+            str(level): group.to_dict("records")
+            for level, group in df.groupby("failure_risk_level", sort=False)
+        }
+
+    @staticmethod
+    def get_summary_stats(
+        predictions: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Aggregate counts and averages over a prediction batch."""
+        if not predictions:
+            return {
+                "totalBuildings": 0,
+                "criticalCount": 0,
+                "highRiskCount": 0,
+                "mediumRiskCount": 0,
+                "lowRiskCount": 0,
+                "averageFailureProbability": 0.0,
+                "averageEstimatedDays": 0,
+                "topConcerns": {},
+                "actionRequired": 0,
+            }
+        # One hashed value_counts pass replaces a boolean scan per level
+        df = pd.DataFrame(predictions)
+        vc = df["failure_risk_level"].value_counts().to_dict()
+        critical = vc.get("CRITICAL", 0)
+        high = vc.get("HIGH", 0)
+
+        concerns: Dict[str, int] = {}
+        if "primary_concern" in df.columns:
+            concerns = df["primary_concern"].value_counts().to_dict()
+
+        return {
+            "totalBuildings": len(df),
+            "criticalCount": critical,
+            "highRiskCount": high,
+            "mediumRiskCount": vc.get("MEDIUM", 0),
+            "lowRiskCount": vc.get("LOW", 0),
+            "averageFailureProbability": round(
+                float(df["failure_probability"].mean()), 4
+            ),
+            "averageEstimatedDays": int(
+                df["estimated_days_to_failure"].mean()
+            ),
+            "topConcerns": concerns,
+            "actionRequired": critical + high,
+        }
+
+
+class AlertSystem:
+    """Builds maintenance alerts from high-risk predictions."""
+
+    # msg_tmpl bakes the title in per level so one format_map call
+    # renders the whole message straight from the prediction dict
+    ALERT_TEMPLATES = {
+        "CRITICAL": {
+            "title": "Critical failure risk",
+            "priority": 1,
+            "msg_tmpl": (
+                "Critical failure risk for {building_name}. "
+                "Failure probability: {failure_probability:.0%}. "
+                "Estimated days to failure: ~{estimated_days_to_failure}."
+            ),
+        },
+        "HIGH": {
+            "title": "High failure risk",
+            "priority": 2,
+            "msg_tmpl": (
+                "High failure risk for {building_name}. "
+                "Failure probability: {failure_probability:.0%}. "
+                "Estimated days to failure: ~{estimated_days_to_failure}."
+            ),
+        },
+    }
+
+    @classmethod
+    def generate_alert(
+        cls,
+        prediction: Dict[str, Any],
+        now: Optional[datetime] = None,
+        seq: int = 0,
+    ) -> Dict[str, Any]:
+        """One alert dict for a single high-risk prediction.
+
+        Batch callers pass a shared `now` and a sequence number so the
+        whole batch uses one clock read; the sequence keeps ids unique.
+        """
+        if now is None:
+            now = datetime.now()
+        template = cls.ALERT_TEMPLATES[prediction["failure_risk_level"]]
+        message = template["msg_tmpl"].format_map(prediction)
+        return {
+            "id": f"alert-{now.timestamp()}-{seq}",
+            "building_id": prediction["building_id"],
+            "building_name": prediction["building_name"],
+            "title": template["title"],
+            "priority": template["priority"],
+            "message": message,
+            "risk_level": prediction["failure_risk_level"],
+            "created_at": now.isoformat(),
+        }
+
+    @classmethod
+    def generate_alerts(
+        cls, predictions: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Alerts for every CRITICAL/HIGH prediction, highest first.
+
+        With only two alerting levels a bucket per level replaces the
+        final comparison sort: append into the level's bucket, then
+        concatenate buckets in priority order.
+        """
+        now = datetime.now()
+        buckets: Dict[str, List[Dict[str, Any]]] = {
+            level: [] for level in cls.ALERT_TEMPLATES
+        }
+        seq = 0
+        for prediction in predictions:
+            bucket = buckets.get(prediction["failure_risk_level"])
+            if bucket is None:
+                continue
+            bucket.append(cls.generate_alert(prediction, now=now, seq=seq))
+            seq += 1
+        return buckets["CRITICAL"] + buckets["HIGH"]
+
+
+class DataExporter:
+    """Writes prediction batches to CSV / JSON / GeoJSON."""
+
+    @staticmethod
+    def to_csv(predictions: List[Dict[str, Any]], filepath: str) -> None:
+        # Arrow's multithreaded C++ writer when available; pandas'
+        # Python-level writer otherwise
+        if PYARROW_AVAILABLE:
+            pacsv.write_csv(pa.Table.from_pylist(predictions), filepath)
+        else:
+            pd.DataFrame(predictions).to_csv(filepath, index=False)
+        logger.info(f"Exported {len(predictions)} predictions to {filepath}")
+
+    @staticmethod
+    def _write_json(payload: Any, filepath: str, indent: bool) -> None:
+        if ORJSON_AVAILABLE:
+            option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            with open(filepath, "wb") as f:
+                f.write(orjson.dumps(payload, option=option))
+        else:
+            with open(filepath, "w") as f:
+                json.dump(payload, f, indent=2 if indent else None, default=str)
+
+    @staticmethod
+    def to_json(predictions: List[Dict[str, Any]], filepath: str) -> None:
+        DataExporter._write_json(predictions, filepath, indent=True)
+        logger.info(f"Exported {len(predictions)} predictions to {filepath}")
+
+    @staticmethod
+    def to_geojson(
+        predictions: List[Dict[str, Any]],
+        buildings_df: pd.DataFrame,
+        filepath: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """GeoJSON FeatureCollection of predictions for buildings that
+        have coordinates; buildings without them are skipped."""
+        # One pass builds an id -> (lon, lat) dict; each prediction is
+        # then a hash lookup instead of a column scan
+        coords: Dict[Any, Any] = {}
+        if {"latitude", "longitude"} <= set(buildings_df.columns):
+            with_coords = buildings_df.dropna(
+                subset=["longitude", "latitude"]
+            )
+            coords = dict(
+                zip(
+                    with_coords["id"],
+                    zip(
+                        with_coords["longitude"].astype(float),
+                        with_coords["latitude"].astype(float),
+                    ),
+                )
+            )
+        features = []
+        for prediction in predictions:
+            point = coords.get(prediction["building_id"])
+            if point is None:
+                continue
+            features.append(
+                {
+                    "type": "Feature",
+                    "geometry": {
+                        "type": "Point",
+                        "coordinates": list(point),
+                    },
+                    "properties": prediction,
+                }
+            )
+        collection = {"type": "FeatureCollection", "features": features}
+        if filepath:
+            DataExporter._write_json(collection, filepath, indent=False)
+            logger.info(f"Exported {len(features)} features to {filepath}")
+        return collection
+
+
+class MetricsCalculator:
+    """Classification metrics for model evaluation."""
+
+    @staticmethod
+    def calculate_metrics(
+        y_true, y_pred, y_prob=None
+    ) -> Dict[str, Any]:
+        # One bincount over 2*true+pred yields the whole confusion
+        # matrix; every scalar metric then falls out arithmetically,
+        # so the labels are scanned once instead of once per metric
+        y_true = np.asarray(y_true, dtype=np.int64)
+        y_pred = np.asarray(y_pred, dtype=np.int64)
+        cm = np.bincount((y_true << 1) | y_pred, minlength=4)
+        tn, fp, fn, tp = (int(v) for v in cm[:4])
+
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        f1 = (
+            2 * precision * recall / (precision + recall)
+            if precision + recall
+            else 0.0
+        )
+        metrics = {
+            "accuracy": round((tp + tn) / len(y_true), 4),
+            "precision": round(precision, 4),
+            "recall": round(recall, 4),
+            "f1": round(f1, 4),
+            "confusion_matrix": [[tn, fp], [fn, tp]],
+        }
+        if y_prob is not None and len(np.unique(y_true)) > 1:
+            metrics["roc_auc"] = round(
+                float(roc_auc_score(y_true, y_prob)), 4
+            )
+        return metrics
+
+
+class PerformanceMonitor:
+    """Tracks metric drift of a deployed model against its training
+    baseline."""
+
+    DRIFT_THRESHOLD = 0.05
+
+    def __init__(
+        self,
+        baseline_metrics: Optional[Dict[str, float]] = None,
+        capacity: int = 1024,
+    ):
+        self.baseline = dict(baseline_metrics or {})
+        self.capacity = capacity
+        # Fixed-schema ring buffer: metric values live in one float
+        # matrix so memory is bounded and drift is a single vector op.
+        # Columns come from the baseline, or from the first logged batch
+        # when no baseline was given.
+        self.cols: List[str] = list(self.baseline)
+        self.hist_vals: Optional[np.ndarray] = None
+        self.hist_ts = np.empty(capacity, dtype="datetime64[ns]")
+        self.n = 0
+
+    def _ensure_buffer(self, metrics: Dict[str, float]) -> None:
+        if self.hist_vals is not None:
+            return
+        if not self.cols:
+            self.cols = list(metrics)
+        self.hist_vals = np.empty(
+            (self.capacity, len(self.cols)), dtype=np.float64
+        )
+        self._baseline_vec = np.array(
+            [self.baseline.get(c, np.nan) for c in self.cols]
+        )
+        self._denom = np.where(
+            self._baseline_vec != 0, self._baseline_vec, 1.0
+        )
+        self._tracked = ~np.isnan(self._baseline_vec)
+
+    def log_metrics(self, metrics: Dict[str, float]) -> None:
+        self._ensure_buffer(metrics)
+        slot = self.n % self.capacity
+        self.hist_vals[slot] = [
+            float(metrics.get(c, np.nan)) for c in self.cols
+        ]
+        self.hist_ts[slot] = np.datetime64(datetime.now())
+        self.n += 1
+
+    def _calculate_drift(self, current: np.ndarray) -> np.ndarray:
+        """Relative change of one metric row against the baseline."""
+        return (current - self._baseline_vec) / self._denom
+
+    def get_performance_summary(self) -> Dict[str, Any]:
+        if self.n == 0:
+            return {"n_logged": 0, "drift": {}, "drift_detected": False}
+        slot = (self.n - 1) % self.capacity
+        current = self.hist_vals[slot]
+        drift_vec = self._calculate_drift(current)
+        drift = {
+            c: round(float(drift_vec[i]), 4)
+            for i, c in enumerate(self.cols)
+            if self._tracked[i]
+        }
+        latest = {
+            "timestamp": str(self.hist_ts[slot]),
+            **{c: float(current[i]) for i, c in enumerate(self.cols)},
+        }
+        tracked_drift = drift_vec[self._tracked]
+        return {
+            "n_logged": self.n,
+            "latest": latest,
+            "drift": drift,
+            "drift_detected": bool(
+                np.any(np.abs(tracked_drift) > self.DRIFT_THRESHOLD)
+            ),
+        }